@@ -8,5 +8,45 @@ load_dotenv()
 class Settings:
     bot_token: str = os.getenv("BOT_TOKEN")
     database_url: str = os.getenv("DATABASE_URL")
+    instance_id: str = os.getenv("INSTANCE_ID")
+    state_sync: bool = os.getenv("STATE_SYNC", "1") == "1"
+    telegram_api_url: str = os.getenv("TELEGRAM_API_URL")
+    bot_mode: str = os.getenv("BOT_MODE", "polling")
+    webhook_host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    webhook_port: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+    webhook_path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    webhook_health_path: str = os.getenv("WEBHOOK_HEALTH_PATH", "/healthz")
+    webhook_secret: str = os.getenv("WEBHOOK_SECRET")
+    webhook_url: str = os.getenv("WEBHOOK_URL")
+    webhook_max_in_flight: int = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", "100000"))
+    user_cache_ttl: float = float(os.getenv("USER_CACHE_TTL", "600"))
+    matchmaking_claim_interval: float = float(os.getenv("MATCHMAKING_CLAIM_INTERVAL", "0"))
+    matchmaking_claim_batch: int = int(os.getenv("MATCHMAKING_CLAIM_BATCH", "100"))
+    interest_match_wait: float = float(os.getenv("INTEREST_MATCH_WAIT", "10"))
+    metrics_host: str = os.getenv("METRICS_HOST", "0.0.0.0")
+    metrics_port: int = int(os.getenv("METRICS_PORT", "9100"))
+    media_group_window: float = float(os.getenv("MEDIA_GROUP_WINDOW", "0.5"))
+    send_global_rate: float = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+    send_chat_rate: float = float(os.getenv("SEND_CHAT_RATE", "1"))
+    send_chat_burst: float = float(os.getenv("SEND_CHAT_BURST", "3"))
+    send_queue_size: int = int(os.getenv("SEND_QUEUE_SIZE", "1000"))
+    events_batch_size: int = int(os.getenv("EVENTS_BATCH_SIZE", "500"))
+    events_flush_interval: float = float(os.getenv("EVENTS_FLUSH_INTERVAL", "1"))
+    events_max_buffer: int = int(os.getenv("EVENTS_MAX_BUFFER", "50000"))
+    sweep_interval: float = float(os.getenv("SWEEP_INTERVAL", "60"))
+    chat_idle_timeout: float = float(os.getenv("CHAT_IDLE_TIMEOUT", "1800"))
+    search_timeout: float = float(os.getenv("SEARCH_TIMEOUT", "900"))
+    sweep_batch: int = int(os.getenv("SWEEP_BATCH", "500"))
+    throttle_limits: str = os.getenv(
+        "THROTTLE_LIMITS",
+        "default=1/5,command=0.5/3,callback=1/5,sticker=0.3/3,animation=0.3/3,photo=1/10,video=1/10,document=1/10",
+    )
+    throttle_max_buckets: int = int(os.getenv("THROTTLE_MAX_BUCKETS", "100000"))
+    shutdown_timeout: float = float(os.getenv("SHUTDOWN_TIMEOUT", "20"))
+    log_level: str = os.getenv("LOG_LEVEL", "INFO")
+    log_json: bool = os.getenv("LOG_JSON", "0") == "1"
+    log_sample_rate: float = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+    log_rate_limit: float = float(os.getenv("LOG_RATE_LIMIT", "0"))
 
 settings = Settings()
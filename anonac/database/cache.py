@@ -0,0 +1,140 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional
+
+# Маркер "поле не загружено": signal_id легитимно может быть None.
+UNKNOWN = object()
+
+
+class _Entry:
+    __slots__ = ("status", "signal_id", "expires_at", "version")
+
+    def __init__(self, status: Any, signal_id: Any, expires_at: float, version: int):
+        self.status = status
+        self.signal_id = signal_id
+        self.expires_at = expires_at
+        self.version = version
+
+
+class UserStateCache:
+    """
+    LRU-кэш статуса и собеседника пользователей с TTL.
+    Заполняется при чтении и обновляется при записи через UserController.
+
+    Каждая запись и сброс получают номер версии. Результат чтения из базы
+    кладётся с since=stamp(), взятым до запроса, и отбрасывается, если
+    за время запроса запись пользователя или весь кэш уже изменились.
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._version = 0
+        self._cleared_at = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _lookup(self, user_id: int) -> Optional[_Entry]:
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        if entry.expires_at < time.monotonic():
+            del self._entries[user_id]
+            self.evictions += 1
+            return None
+        self._entries.move_to_end(user_id)
+        return entry
+
+    def get_status(self, user_id: int) -> Any:
+        entry = self._lookup(user_id)
+        if entry is None or entry.status is UNKNOWN:
+            self.misses += 1
+            return UNKNOWN
+        self.hits += 1
+        return entry.status
+
+    def get_signal_id(self, user_id: int) -> Any:
+        entry = self._lookup(user_id)
+        if entry is None or entry.signal_id is UNKNOWN:
+            self.misses += 1
+            return UNKNOWN
+        self.hits += 1
+        return entry.signal_id
+
+    def stamp(self) -> int:
+        """Текущая версия кэша; передаётся в put(since=...) для результата чтения."""
+        return self._version
+
+    def put(self, user_id: int, status: Any = UNKNOWN, signal_id: Any = UNKNOWN, since: Optional[int] = None) -> bool:
+        """
+        Записывает известные поля; неуказанные поля существующей записи сохраняются.
+        С since запись пропускается (возвращается False), если запись
+        пользователя или весь кэш изменились после stamp() == since.
+        """
+        now = time.monotonic()
+        entry = self._entries.get(user_id)
+        if entry is not None and entry.expires_at < now:
+            entry = None
+        if since is not None and (since < self._cleared_at or (entry is not None and entry.version > since)):
+            return False
+
+        self._version += 1
+        if entry is None:
+            self._entries[user_id] = _Entry(status, signal_id, now + self.ttl, self._version)
+        else:
+            if status is not UNKNOWN:
+                entry.status = status
+            if signal_id is not UNKNOWN:
+                entry.signal_id = signal_id
+            entry.expires_at = now + self.ttl
+            entry.version = self._version
+        self._entries.move_to_end(user_id)
+        self._evict()
+        return True
+
+    def _evict(self):
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_ids: Iterable[int]):
+        # Вместо удаления остаётся пустая запись с новой версией, чтобы
+        # начатое раньше чтение не вернуло в кэш устаревшее состояние.
+        expires_at = time.monotonic() + self.ttl
+        for user_id in user_ids:
+            self._version += 1
+            self._entries[user_id] = _Entry(UNKNOWN, UNKNOWN, expires_at, self._version)
+            self._entries.move_to_end(user_id)
+        self._evict()
+
+    def clear(self):
+        self._entries.clear()
+        self._version += 1
+        self._cleared_at = self._version
+
+    def begin_reload(self) -> int:
+        """
+        Начинает перезагрузку кэша из базы без сброса: чтения, начатые раньше,
+        больше не записываются. Возвращает since для put() и end_reload().
+        """
+        self._version += 1
+        self._cleared_at = self._version
+        return self._version
+
+    def end_reload(self, since: int):
+        """Удаляет записи, которые не обновлялись после begin_reload()."""
+        for user_id in [user_id for user_id, entry in self._entries.items() if entry.version <= since]:
+            del self._entries[user_id]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -1,56 +1,183 @@
+import asyncio
 import asyncpg
 import logging
-from typing import Optional, List, Union
+import uuid
+from typing import AsyncIterator, Awaitable, Callable, Optional, List, Set, Tuple, Union
+from anonac.database.cache import UserStateCache, UNKNOWN
+from anonac.database.migrate import run_migrations
+from anonac.metrics import timed_query
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
 class Database:
-    def __init__(self, dsn: str):
+    def __init__(self, dsn: str, instance_id: Optional[str] = None):
         self.dsn = dsn
+        # Попадает в application_name соединений: по нему триггер уведомлений
+        # помечает источник изменения, а экземпляр пропускает свои события.
+        self.instance_id = instance_id or f"anonac-{uuid.uuid4().hex[:12]}"
         self.pool: Optional[asyncpg.pool.Pool] = None
+        self._listeners: List[asyncio.Task] = []
 
-    async def connect(self):
-        self.pool = await asyncpg.create_pool(dsn=self.dsn)
+    @property
+    def server_settings(self) -> dict:
+        return {"application_name": self.instance_id}
+
+    async def connect(self, migrate: bool = True):
+        self.pool = await asyncpg.create_pool(dsn=self.dsn, server_settings=self.server_settings)
         logger.info("Подключение к базе данных установлено.")
+        if migrate:
+            await run_migrations(self.pool)
+
+    def listen(
+        self,
+        channel: str,
+        callback: Callable[[asyncpg.Connection, int, str, str], None],
+        on_connect: Optional[Callable[[bool], Awaitable[None]]] = None,
+        keepalive: float = 30.0,
+    ):
+        """
+        Слушает канал NOTIFY на отдельном соединении вне пула и переподключается
+        при обрыве. on_connect(reconnected) вызывается после каждой подписки.
+        """
+        task = asyncio.create_task(self._listen_loop(channel, callback, on_connect, keepalive))
+        self._listeners.append(task)
+
+    async def _listen_loop(self, channel, callback, on_connect, keepalive):
+        delay = 1.0
+        reconnected = False
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(dsn=self.dsn, server_settings=self.server_settings)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _: lost.set())
+                await conn.add_listener(channel, callback)
+                logger.info("Подписка на канал %s установлена.", channel)
+                if on_connect is not None:
+                    await on_connect(reconnected)
+                delay = 1.0
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), keepalive)
+                    except asyncio.TimeoutError:
+                        await conn.execute("SELECT 1")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Соединение для канала %s потеряно: %s", channel, e)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            reconnected = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
 
     async def close(self):
+        for task in self._listeners:
+            task.cancel()
+        await asyncio.gather(*self._listeners, return_exceptions=True)
+        self._listeners.clear()
         if self.pool:
             await self.pool.close()
             logger.info("Подключение к базе данных закрыто.")
 
+# Общая часть запросов соединения пар: обновляет обоих пользователей
+# каждой пары из CTE matched(a, b) одним UPDATE и открывает для пары диалог
+# в anonac.sessions.
+_PAIR_UPDATE_SQL = """
+    updated AS (
+        UPDATE anonac.userdata u
+        SET status = 'active',
+            signal_id = CASE WHEN u.id = m.a THEN m.b ELSE m.a END,
+            update_at = NOW()
+        FROM matched m
+        WHERE u.id = m.a OR u.id = m.b
+        RETURNING u.id, u.signal_id
+    ),
+    started AS (
+        INSERT INTO anonac.sessions (user_a, user_b)
+        SELECT a, b FROM matched
+    )
+"""
+
+
 class UserController:
-    def __init__(self, db: Database):
+    def __init__(self, db: Database, cache: Optional[UserStateCache] = None):
         self.db = db
+        self.cache = cache
+        self._touched: Set[int] = set()
+
+    def _user_ids(self, user_ids: Union[int, List[int]]) -> List[int]:
+        return [user_ids] if isinstance(user_ids, int) else list(user_ids)
 
-    async def register_user(self, telegram_id: int, telegram_name: Optional[str]) -> bool:
+    @timed_query
+    async def _load_state(self, id: int) -> Optional[asyncpg.Record]:
+        since = self.cache.stamp() if self.cache is not None else None
+        async with self.db.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                "SELECT status, signal_id FROM anonac.userdata WHERE id = $1",
+                id
+            )
+        # Запись, сделанная во время запроса, новее прочитанной строки.
+        if row and self.cache is not None:
+            self.cache.put(id, row["status"], row["signal_id"], since=since)
+        return row
+
+    @timed_query
+    async def register_user(self, telegram_id: int, telegram_name: Optional[str]) -> Optional[bool]:
+        """
+        Регистрирует пользователя одним INSERT ... ON CONFLICT DO NOTHING.
+        Возвращает True, если пользователь добавлен, False, если он уже был,
+        и None при ошибке.
+        """
         try:
             async with self.db.pool.acquire() as conn:
-                async with conn.transaction():
-                    existing = await conn.fetchrow(
-                        "SELECT id FROM anonac.userdata WHERE id = $1",
-                        telegram_id
-                    )
-                    if existing:
-                        logger.info(f"Пользователь уже существует с ID: {telegram_id}")
-                        return False
-
-                    await conn.execute(
-                        """
-                        INSERT INTO anonac.userdata (id, name, status, register_at, update_at)
-                        VALUES ($1, $2, 'unactive', NOW(), NOW())
-                        """,
-                        telegram_id, telegram_name
-                    )
-                    logger.info(f"Пользователь добавлен с ID {telegram_id}")
-                    return True
+                result = await conn.execute(
+                    """
+                    INSERT INTO anonac.userdata (id, name, status, register_at, update_at)
+                    VALUES ($1, $2, 'unactive', NOW(), NOW())
+                    ON CONFLICT (id) DO NOTHING
+                    """,
+                    telegram_id, telegram_name
+                )
         except Exception as e:
-            logger.error(f"Ошибка при регистрации пользователя с ID {telegram_id}: {e}")
+            logger.error("Ошибка при регистрации пользователя с ID %s: %s", telegram_id, e)
+            return None
+
+        if result == "INSERT 0 0":
             return False
+        if self.cache is not None:
+            self.cache.put(telegram_id, "unactive", None)
+        logger.info("Пользователь добавлен с ID %s", telegram_id)
+        return True
+
+    async def stream_runtime_state(self, batch: int = 10_000) -> AsyncIterator[asyncpg.Record]:
+        """
+        Одним запросом читает курсором пользователей в диалоге и в поиске: ID,
+        статус, собеседника и параметры поиска. Строки приходят пачками по
+        batch, поэтому результат не собирается в памяти и не сортируется в
+        базе; частичные индексы по статусу ограничивают чтение этими строками.
+        """
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor(
+                    """
+                    SELECT id, status, signal_id, interests, gender, search_gender, update_at
+                    FROM anonac.userdata
+                    WHERE status IN ('active', 'search')
+                    """,
+                    prefetch=batch
+                ):
+                    yield row
 
+    async def stream_user_ids(self, batch: int = 10_000) -> AsyncIterator[int]:
+        """Читает курсором ID всех зарегистрированных пользователей."""
+        async with self.db.pool.acquire() as conn:
+            async with conn.transaction(readonly=True):
+                async for row in conn.cursor("SELECT id FROM anonac.userdata", prefetch=batch):
+                    yield row["id"]
+
+    @timed_query
     async def get_user_id(self, id: int) -> Optional[asyncpg.Record]:
         try:
             async with self.db.pool.acquire() as conn:
@@ -60,40 +187,57 @@ class UserController:
                 )
                 return user
         except Exception as e:
-            logger.error(f"Ошибка при получении пользователя с ID {telegram_id}: {e}")
+            logger.error("Ошибка при получении пользователя с ID %s: %s", id, e)
             return None
         
     async def get_status(self, id: int) -> Optional[str]:
         """
         Возвращает статус пользователя по его telegram_id.
         """
+        if self.cache is not None:
+            status = self.cache.get_status(id)
+            if status is not UNKNOWN:
+                return status
         try:
-            async with self.db.pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    "SELECT status FROM anonac.userdata WHERE id = $1",
-                    id
-                )
-                if row:
-                    return row["status"]
-                else:
-                    logger.info(f"Пользователь с ID {id} не найден.")
-                    return None
+            row = await self._load_state(id)
+            if row:
+                return row["status"]
+            else:
+                logger.info("Пользователь с ID %s не найден.", id)
+                return None
         except Exception as e:
-            logger.error(f"Ошибка при получении статуса пользователя с ID {id}: {e}")
+            logger.error("Ошибка при получении статуса пользователя с ID %s: %s", id, e)
             return None
-        
+
+    async def get_signal_id(self, id: int) -> Optional[int]:
+        """
+        Возвращает ID собеседника пользователя без загрузки его записи.
+        """
+        if self.cache is not None:
+            signal_id = self.cache.get_signal_id(id)
+            if signal_id is not UNKNOWN:
+                return signal_id
+        try:
+            row = await self._load_state(id)
+            return row["signal_id"] if row else None
+        except Exception as e:
+            logger.error("Ошибка при получении собеседника пользователя с ID %s: %s", id, e)
+            return None
+
+    @timed_query
     async def get_status_list(self, status: str) -> List[asyncpg.Record]:
         try:
             async with self.db.pool.acquire() as conn:
                 rows = await conn.fetch(
-                    "SELECT * FROM anonac.userdata WHERE status = $1",
+                    "SELECT * FROM anonac.userdata WHERE status = $1 ORDER BY update_at",
                     status
                 )
                 return rows
         except Exception as e:
-            logger.error(f"Ошибка при получении пользователей со статусом {status}: {e}")
+            logger.error("Ошибка при получении пользователей со статусом %s: %s", status, e)
             return []
         
+    @timed_query
     async def get_signal(self, id: int) -> Optional[asyncpg.Record]:
         try:
             async with self.db.pool.acquire() as conn:
@@ -103,7 +247,7 @@ class UserController:
                     id
                 )
                 if not row or not row["signal_id"]:
-                    logger.info(f"У пользователя {id} нет активного сигнала.")
+                    logger.info("У пользователя %s нет активного сигнала.", id)
                     return None
 
                 signal_id = row["signal_id"]
@@ -115,8 +259,10 @@ class UserController:
                 return signal_user
             
         except Exception as e:
-            logger.error(f"Ошибка при получении объекта signal для пользователя {user_id}: {e}")
+            logger.error("Ошибка при получении объекта signal для пользователя %s: %s", id, e)
             return None
+
+    @timed_query
     async def set_signal(self, user_ids: Union[int, List[int]], signal_id: Optional[int]):
         try:
             async with self.db.pool.acquire() as conn:
@@ -128,10 +274,10 @@ class UserController:
                         signal_id, user_ids
                     )
                     if result == "UPDATE 0":
-                        logger.warning(f"Пользователь с ID {user_ids} не найден.")
+                        logger.warning("Пользователь с ID %s не найден.", user_ids)
                     else:
                         action = "очищен" if signal_id is None else f"установлен на {signal_id}"
-                        logger.info(f"[Info] Сигнал пользователя с ID {user_ids} {action}.")
+                        logger.info("[Info] Сигнал пользователя с ID %s %s.", user_ids, action)
                 else:
                     if signal_id is not None:
                         raise ValueError("Для списка user_ids signal_id должен быть None (только очистка).")
@@ -142,10 +288,16 @@ class UserController:
                         """,
                         user_ids
                     )
-                    logger.info(f"[Info] Сигналы очищены для пользователей с ID {user_ids}.")
+                    logger.info("[Info] Сигналы очищены для пользователей с ID %s.", user_ids)
+            if self.cache is not None:
+                for user_id in self._user_ids(user_ids):
+                    self.cache.put(user_id, signal_id=signal_id)
         except Exception as e:
-            logger.error(f"Ошибка при обновлении сигналов для пользователей {user_ids}: {e}")
+            if self.cache is not None:
+                self.cache.invalidate(self._user_ids(user_ids))
+            logger.error("Ошибка при обновлении сигналов для пользователей %s: %s", user_ids, e)
 
+    @timed_query
     async def set_status(self, user_ids: Union[int, List[int]], status: str):
         try:
             async with self.db.pool.acquire() as conn:
@@ -157,9 +309,9 @@ class UserController:
                         status, user_ids
                     )
                     if result == "UPDATE 0":
-                        logger.warning(f"Пользователь с ID {user_ids} не найден.")
+                        logger.warning("Пользователь с ID %s не найден.", user_ids)
                     else:
-                        logger.info(f"[Info] Статус пользователя с ID {user_ids} обновлён на '{status}'.")
+                        logger.info("[Info] Статус пользователя с ID %s обновлён на '%s'.", user_ids, status)
                 else:
                     result = await conn.execute(
                         """
@@ -169,16 +321,374 @@ class UserController:
                     )
                     updated_count = int(result.split(" ")[1]) if "UPDATE" in result else 0
                     if updated_count == 0:
-                        logger.warning(f"Пользователи с ID {user_ids} не найдены.")
+                        logger.warning("Пользователи с ID %s не найдены.", user_ids)
                     else:
-                        logger.info(f"[Info] Статус пользователей с ID {user_ids} обновлён на '{status}'.")
+                        logger.info("[Info] Статус пользователей с ID %s обновлён на '%s'.", user_ids, status)
+            if self.cache is not None:
+                for user_id in self._user_ids(user_ids):
+                    self.cache.put(user_id, status=status)
+        except Exception as e:
+            if self.cache is not None:
+                self.cache.invalidate(self._user_ids(user_ids))
+            logger.error("Ошибка при обновлении статуса для пользователей %s: %s", user_ids, e)
+
+    @timed_query
+    async def pair_users(self, pairs: List[Tuple[int, int]]) -> Tuple[List[Tuple[int, int]], List[int]]:
+        """
+        Атомарно соединяет пары пользователей в поиске одним запросом.
+        Пользователи, заблокированные другой транзакцией или уже вышедшие
+        из поиска, пропускаются (FOR UPDATE SKIP LOCKED), а пары, не
+        подходящие по полу по текущим данным, не соединяются.
+        Возвращает соединённые пары и пользователей, которые остались в поиске,
+        включая пропущенных из-за блокировки: их статус читается тем же
+        запросом без блокировки.
+        """
+        if not pairs:
+            return [], []
+        user_ids = [user_id for pair in pairs for user_id in pair]
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    WITH pairs AS (
+                        SELECT a, b FROM unnest($1::bigint[], $2::bigint[]) AS p(a, b)
+                    ),
+                    claimed AS (
+                        SELECT id, gender, search_gender FROM anonac.userdata
+                        WHERE id = ANY($3::bigint[]) AND status = 'search'
+                        FOR UPDATE SKIP LOCKED
+                    ),
+                    matched AS (
+                        SELECT p.a, p.b FROM pairs p
+                        JOIN claimed ca ON ca.id = p.a
+                        JOIN claimed cb ON cb.id = p.b
+                        WHERE (ca.search_gender IS NULL OR ca.search_gender = cb.gender)
+                          AND (cb.search_gender IS NULL OR cb.search_gender = ca.gender)
+                    ),
+                    """ + _PAIR_UPDATE_SQL + """
+                    SELECT c.id, u.signal_id FROM claimed c LEFT JOIN updated u ON u.id = c.id
+                    UNION ALL
+                    SELECT id, NULL::bigint FROM anonac.userdata
+                    WHERE id = ANY($3::bigint[]) AND status = 'search'
+                      AND id NOT IN (SELECT id FROM claimed)
+                    """,
+                    [a for a, _ in pairs], [b for _, b in pairs], user_ids
+                )
+        except Exception as e:
+            logger.error("Ошибка при соединении пар %s: %s", pairs, e)
+            return [], user_ids
+
+        partners = {row["id"]: row["signal_id"] for row in rows}
+        matched = [(a, b) for a, b in pairs if partners.get(a) == b]
+        waiting = [user_id for user_id, signal_id in partners.items() if signal_id is None]
+        self._cache_pairs(matched)
+        logger.info("[Info] Соединено пар: %s из %s.", len(matched), len(pairs))
+        return matched, waiting
+
+    @timed_query
+    async def claim_pairs(self, limit: int, interest_wait: float = 0) -> List[Tuple[int, int]]:
+        """
+        Забирает до limit самых долго ждущих пользователей в поиске и соединяет
+        их попарно в одной транзакции. Безопасно при нескольких матчерах.
+        Пользователи с фильтром по полу собеседника не затрагиваются, а
+        пользователи с интересами — пока не прошло interest_wait секунд поиска.
+        """
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    WITH claimed AS (
+                        SELECT id, update_at FROM anonac.userdata
+                        WHERE status = 'search' AND search_gender IS NULL
+                          AND (interests IS NULL OR cardinality(interests) = 0
+                               OR update_at < NOW() - make_interval(secs => $2))
+                        ORDER BY update_at
+                        LIMIT $1
+                        FOR UPDATE SKIP LOCKED
+                    ),
+                    numbered AS (
+                        SELECT id, row_number() OVER (ORDER BY update_at, id) - 1 AS rn FROM claimed
+                    ),
+                    matched AS (
+                        SELECT x.id AS a, y.id AS b
+                        FROM numbered x JOIN numbered y ON y.rn = x.rn + 1
+                        WHERE x.rn % 2 = 0
+                    ),
+                    """ + _PAIR_UPDATE_SQL + """
+                    SELECT a, b FROM matched
+                    """,
+                    limit, interest_wait
+                )
+        except Exception as e:
+            logger.error("Ошибка при захвате пользователей в поиске: %s", e)
+            return []
+
+        matched = [(row["a"], row["b"]) for row in rows]
+        self._cache_pairs(matched)
+        if matched:
+            logger.info("[Info] Захвачено и соединено пар: %s.", len(matched))
+        return matched
+
+    @timed_query
+    async def _end_chat(self, user_id: int, new_status: str, from_statuses: List[str]) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Одним запросом переводит пользователя в new_status, если его текущий
+        статус входит в from_statuses, и, если он был в диалоге, завершает
+        диалог у собеседника и закрывает запись в anonac.sessions. Строки блокируются по возрастанию id, поэтому
+        одновременный /stop обоих собеседников не приводит к взаимоблокировке.
+        Возвращает прежний статус пользователя и ID собеседника, чей диалог завершён.
+        """
+        async with self.db.pool.acquire() as conn:
+            row = await conn.fetchrow(
+                """
+                WITH me AS (
+                    SELECT id, signal_id FROM anonac.userdata WHERE id = $1
+                ),
+                locked AS (
+                    SELECT u.id, u.status, u.signal_id
+                    FROM anonac.userdata u, me
+                    WHERE u.id = me.id OR u.id = me.signal_id
+                    ORDER BY u.id
+                    FOR UPDATE OF u
+                ),
+                cur AS (
+                    SELECT id, status, signal_id FROM locked WHERE id = $1
+                ),
+                updated AS (
+                    UPDATE anonac.userdata u
+                    SET status = CASE WHEN u.id = s.id THEN $2 ELSE 'unactive' END,
+                        signal_id = NULL,
+                        update_at = NOW()
+                    FROM cur s
+                    WHERE s.status = ANY($3::text[])
+                      AND (u.id = s.id OR (s.status = 'active' AND u.id = s.signal_id AND u.signal_id = s.id))
+                    RETURNING u.id
+                ),
+                closed AS (
+                    UPDATE anonac.sessions
+                    SET ended_at = NOW(), ended_by = $1
+                    WHERE ended_at IS NULL AND (user_a = $1 OR user_b = $1)
+                      AND (SELECT status FROM cur) = 'active'
+                      AND EXISTS (SELECT 1 FROM updated WHERE id = $1)
+                )
+                SELECT s.status,
+                       (SELECT id FROM updated WHERE id <> $1) AS partner_id,
+                       EXISTS (SELECT 1 FROM updated WHERE id = $1) AS changed
+                FROM cur s
+                """,
+                user_id, new_status, from_statuses
+            )
+
+        if row is None:
+            logger.warning("Пользователь с ID %s не найден.", user_id)
+            return None, None
+
+        partner_id = row["partner_id"]
+        if self.cache is not None:
+            if row["changed"]:
+                self.cache.put(user_id, new_status, None)
+            else:
+                self.cache.put(user_id, row["status"])
+            if partner_id is not None:
+                self.cache.put(partner_id, "unactive", None)
+        if row["changed"]:
+            logger.info("[Info] Пользователь с ID %s: '%s' -> '%s', собеседник %s.", user_id, row['status'], new_status, partner_id)
+        return row["status"], partner_id
+
+    async def end_chat(self, user_id: int) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Завершает активный диалог пользователя (/stop): оба собеседника
+        становятся 'unactive'. Возвращает прежний статус и ID собеседника.
+        """
+        try:
+            return await self._end_chat(user_id, "unactive", ["active"])
         except Exception as e:
-            logger.error(f"Ошибка при обновлении статуса для пользователей {user_ids}: {e}")
+            logger.error("Ошибка при завершении диалога пользователя с ID %s: %s", user_id, e)
+            return None, None
 
+    async def end_chat_and_requeue(self, user_id: int) -> Tuple[Optional[str], Optional[int]]:
+        """
+        Завершает диалог, если он был, и ставит пользователя в поиск (/next);
+        собеседник становится 'unactive'. Возвращает прежний статус и ID собеседника.
+        """
+        try:
+            return await self._end_chat(user_id, "search", ["active", "unactive"])
+        except Exception as e:
+            logger.error("Ошибка при переходе к новому поиску пользователя с ID %s: %s", user_id, e)
+            return None, None
+
+    def touch(self, user_id: int):
+        """Отмечает активность пользователя в диалоге; в базу пишет flush_activity."""
+        self._touched.add(user_id)
+
+    @timed_query
+    async def flush_activity(self) -> int:
+        """Одним запросом обновляет update_at у пользователей, отмеченных touch."""
+        if not self._touched:
+            return 0
+        user_ids, self._touched = list(self._touched), set()
+        try:
+            async with self.db.pool.acquire() as conn:
+                await conn.execute(
+                    """
+                    UPDATE anonac.userdata SET update_at = NOW()
+                    WHERE id = ANY($1::bigint[]) AND status = 'active'
+                    """,
+                    user_ids
+                )
+        except Exception as e:
+            self._touched.update(user_ids)
+            logger.error("Ошибка при обновлении активности пользователей (%s шт.): %s", len(user_ids), e)
+            return 0
+        return len(user_ids)
+
+    @timed_query
+    async def end_idle_chats(self, idle_seconds: float, limit: int) -> List[Tuple[int, int]]:
+        """
+        Завершает до limit диалогов, в которых оба собеседника неактивны
+        дольше idle_seconds. Заблокированные строки пропускаются.
+        Возвращает пары завершённых диалогов.
+        """
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    WITH idle AS (
+                        SELECT a.id AS a, b.id AS b
+                        FROM anonac.userdata a
+                        JOIN anonac.userdata b ON b.id = a.signal_id AND b.signal_id = a.id
+                        WHERE a.status = 'active' AND b.status = 'active' AND a.id < b.id
+                          AND a.update_at < NOW() - make_interval(secs => $1)
+                          AND b.update_at < NOW() - make_interval(secs => $1)
+                        ORDER BY a.update_at
+                        LIMIT $2
+                        FOR UPDATE OF a, b SKIP LOCKED
+                    ),
+                    updated AS (
+                        UPDATE anonac.userdata u
+                        SET status = 'unactive', signal_id = NULL, update_at = NOW()
+                        FROM idle i
+                        WHERE u.id = i.a OR u.id = i.b
+                    ),
+                    closed AS (
+                        UPDATE anonac.sessions s
+                        SET ended_at = NOW()
+                        FROM idle i
+                        WHERE s.ended_at IS NULL AND (s.user_a = i.a OR s.user_b = i.a)
+                    )
+                    SELECT a, b FROM idle
+                    """,
+                    float(idle_seconds), limit
+                )
+        except Exception as e:
+            logger.error("Ошибка при завершении простаивающих диалогов: %s", e)
+            return []
+
+        ended = [(row["a"], row["b"]) for row in rows]
+        if self.cache is not None:
+            for a, b in ended:
+                self.cache.put(a, "unactive", None)
+                self.cache.put(b, "unactive", None)
+        if ended:
+            logger.info("[Info] Завершено простаивающих диалогов: %s.", len(ended))
+        return ended
+
+    @timed_query
+    async def expire_searches(self, wait_seconds: float, limit: int) -> List[int]:
+        """
+        Снимает с поиска до limit пользователей, ждущих дольше wait_seconds.
+        Возвращает их ID.
+        """
+        try:
+            async with self.db.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    WITH stale AS (
+                        SELECT id FROM anonac.userdata
+                        WHERE status = 'search' AND update_at < NOW() - make_interval(secs => $1)
+                        ORDER BY update_at
+                        LIMIT $2
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    UPDATE anonac.userdata u
+                    SET status = 'unactive', update_at = NOW()
+                    FROM stale s
+                    WHERE u.id = s.id
+                    RETURNING u.id
+                    """,
+                    float(wait_seconds), limit
+                )
+        except Exception as e:
+            logger.error("Ошибка при снятии с поиска долго ждущих пользователей: %s", e)
+            return []
+
+        expired = [row["id"] for row in rows]
+        if self.cache is not None:
+            for user_id in expired:
+                self.cache.put(user_id, "unactive", None)
+        if expired:
+            logger.info("[Info] Снято с поиска по таймауту: %s.", len(expired))
+        return expired
+
+    def _cache_pairs(self, pairs: List[Tuple[int, int]]):
+        if self.cache is None:
+            return
+        for a, b in pairs:
+            self.cache.put(a, "active", b)
+            self.cache.put(b, "active", a)
+
+    @timed_query
+    async def get_search_profile(self, user_id: int) -> Optional[asyncpg.Record]:
+        """
+        Возвращает интересы, пол и желаемый пол собеседника для очереди поиска.
+        """
+        try:
+            async with self.db.pool.acquire() as conn:
+                return await conn.fetchrow(
+                    "SELECT interests, gender, search_gender FROM anonac.userdata WHERE id = $1",
+                    user_id
+                )
+        except Exception as e:
+            logger.error("Ошибка при получении параметров поиска пользователя с ID %s: %s", user_id, e)
+            return None
+
+    @timed_query
+    async def get_interests(self, user_id: int) -> List[str]:
+        try:
+            async with self.db.pool.acquire() as conn:
+                interests = await conn.fetchval(
+                    "SELECT interests FROM anonac.userdata WHERE id = $1",
+                    user_id
+                )
+                return list(interests or [])
+        except Exception as e:
+            logger.error("Ошибка при получении интересов пользователя с ID %s: %s", user_id, e)
+            return []
+
+    @timed_query
+    async def set_interests(self, user_id: int, interests: List[str]):
+        try:
+            async with self.db.pool.acquire() as conn:
+                result = await conn.execute(
+                    """
+                    UPDATE anonac.userdata
+                    SET interests = $1, update_at = NOW()
+                    WHERE id = $2
+                    """,
+                    interests or None, user_id
+                )
+                if result == "UPDATE 0":
+                    logger.warning("Пользователь с ID %s не найден.", user_id)
+                else:
+                    logger.info("[Info] Интересы пользователя с ID %s обновлены на %s.", user_id, interests)
+        except Exception as e:
+            logger.error("Ошибка при обновлении интересов пользователя с ID %s: %s", user_id, e)
+
+    @timed_query
     async def set_gender(self, user_id: int, gender: str):
         allowed_genders = {'male', 'female', 'other'}
         if gender not in allowed_genders:
-            logger.error(f"Недопустимое значение gender: {gender}. Допустимо только {allowed_genders}")
+            logger.error("Недопустимое значение gender: %s. Допустимо только %s", gender, allowed_genders)
             raise ValueError(f"Недопустимое значение gender: {gender}. Допустимо только {allowed_genders}")
 
         try:
@@ -192,8 +702,32 @@ class UserController:
                     gender, user_id
                 )
                 if result == "UPDATE 0":
-                    logger.warning(f"Пользователь с ID {user_id} не найден.")
+                    logger.warning("Пользователь с ID %s не найден.", user_id)
+                else:
+                    logger.info("[Info] Пол пользователя с ID %s обновлён на '%s'.", user_id, gender)
+        except Exception as e:
+            logger.error("Ошибка при обновлении пола пользователя с ID %s: %s", user_id, e)
+
+    @timed_query
+    async def set_search_gender(self, user_id: int, gender: Optional[str]):
+        allowed_genders = {'male', 'female', None}
+        if gender not in allowed_genders:
+            logger.error("Недопустимое значение search_gender: %s. Допустимо только %s", gender, allowed_genders)
+            raise ValueError(f"Недопустимое значение search_gender: {gender}. Допустимо только {allowed_genders}")
+
+        try:
+            async with self.db.pool.acquire() as conn:
+                result = await conn.execute(
+                    """
+                    UPDATE anonac.userdata
+                    SET search_gender = $1, update_at = NOW()
+                    WHERE id = $2
+                    """,
+                    gender, user_id
+                )
+                if result == "UPDATE 0":
+                    logger.warning("Пользователь с ID %s не найден.", user_id)
                 else:
-                    logger.info(f"[Info] Пол пользователя с ID {user_id} обновлён на '{gender}'.")
+                    logger.info("[Info] Желаемый пол собеседника пользователя с ID %s обновлён на '%s'.", user_id, gender)
         except Exception as e:
-            logger.error(f"Ошибка при обновлении пола пользователя с ID {user_id}: {e}")
+            logger.error("Ошибка при обновлении желаемого пола собеседника пользователя с ID %s: %s", user_id, e)
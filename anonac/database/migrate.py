@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import re
+from pathlib import Path
+from typing import List, Tuple
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).with_name("migrations")
+# Ключ advisory-блокировки: миграции выполняет только один экземпляр за раз.
+LOCK_KEY = 0x616E6F6E
+# Первая строка файла, если миграцию нельзя выполнять в транзакции
+# (например, CREATE INDEX CONCURRENTLY). Такой файл — одна команда.
+NO_TRANSACTION = "-- migrate: no-transaction"
+# Пауза между попытками взять блокировку миграций.
+LOCK_POLL_INTERVAL = 1.0
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)", re.IGNORECASE
+)
+
+
+def discover() -> List[Tuple[int, str, Path]]:
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        match = re.match(r"(\d+)_(.+)\.sql$", path.name)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), path))
+    return migrations
+
+
+async def _acquire_lock(conn: asyncpg.Connection):
+    """
+    Берёт блокировку миграций опросом pg_try_advisory_lock. Ожидание в
+    pg_advisory_lock держит снимок, которого ждёт CREATE INDEX CONCURRENTLY
+    другого экземпляра, и сессии взаимно блокируются.
+    """
+    waiting = False
+    while not await conn.fetchval("SELECT pg_try_advisory_lock($1)", LOCK_KEY):
+        if not waiting:
+            logger.info("Миграции выполняет другой экземпляр, ждём.")
+            waiting = True
+        await asyncio.sleep(LOCK_POLL_INTERVAL)
+
+
+async def _drop_invalid_indexes(conn: asyncpg.Connection, sql: str):
+    """
+    Удаляет индексы миграции, оставшиеся INVALID после прерванной сборки
+    CONCURRENTLY: иначе IF NOT EXISTS пропустит их, и миграция будет
+    отмечена как применённая.
+    """
+    for name in CONCURRENT_INDEX.findall(sql):
+        invalid = await conn.fetchval(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'anonac' AND c.relname = $1 AND NOT i.indisvalid
+            )
+            """,
+            name
+        )
+        if invalid:
+            logger.warning("Удаляется недостроенный индекс anonac.%s.", name)
+            await conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS anonac."{name}"')
+
+
+async def run_migrations(pool: asyncpg.pool.Pool) -> List[int]:
+    """Применяет ещё не применённые миграции по порядку версий."""
+    applied_now = []
+    async with pool.acquire() as conn:
+        await _acquire_lock(conn)
+        try:
+            await conn.execute(
+                """
+                CREATE SCHEMA IF NOT EXISTS anonac;
+                CREATE TABLE IF NOT EXISTS anonac.schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+                );
+                """
+            )
+            applied = {row["version"] for row in await conn.fetch("SELECT version FROM anonac.schema_migrations")}
+
+            for version, name, path in discover():
+                if version in applied:
+                    continue
+                sql = path.read_text(encoding="utf-8")
+                if sql.startswith(NO_TRANSACTION):
+                    await _drop_invalid_indexes(conn, sql)
+                    await conn.execute(sql)
+                    await conn.execute(
+                        "INSERT INTO anonac.schema_migrations (version, name) VALUES ($1, $2)",
+                        version, name
+                    )
+                else:
+                    async with conn.transaction():
+                        await conn.execute(sql)
+                        await conn.execute(
+                            "INSERT INTO anonac.schema_migrations (version, name) VALUES ($1, $2)",
+                            version, name
+                        )
+                applied_now.append(version)
+                logger.info("Применена миграция %04d_%s.", version, name)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", LOCK_KEY)
+    return applied_now
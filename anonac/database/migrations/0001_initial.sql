@@ -0,0 +1,42 @@
+-- Исходная схема из init-db/init.sql. Идемпотентна: базы, созданные
+-- прежним init.sql, просто получают недостающие объекты.
+
+-- Создание таблицы anonac.userdata
+CREATE TABLE IF NOT EXISTS anonac.userdata (
+    id BIGINT PRIMARY KEY,                            -- Telegram ID
+    name TEXT,                                        -- Имя пользователя (username)
+    status TEXT CHECK (status IN ('active', 'unactive', 'search')),  -- Статус пользователя
+    signal_id BIGINT REFERENCES anonac.userdata(id) ON DELETE SET NULL, -- ID собеседника
+    gender TEXT CHECK (gender IN ('male', 'female')),                 -- Пол пользователя
+    interests TEXT[],                                  -- Интересы (список)
+    register_at TIMESTAMP DEFAULT NOW(),              -- Дата регистрации
+    update_at TIMESTAMP DEFAULT NOW()                 -- Последнее обновление
+);
+
+-- Желаемый пол собеседника (добавлен после первого выпуска схемы)
+ALTER TABLE anonac.userdata
+    ADD COLUMN IF NOT EXISTS search_gender TEXT CHECK (search_gender IN ('male', 'female'));
+
+-- Индекс для поиска по пересечению интересов (interests && ...)
+CREATE INDEX IF NOT EXISTS userdata_interests_idx ON anonac.userdata USING GIN (interests);
+
+-- Уведомления об изменении статуса и собеседника для синхронизации
+-- состояния между экземплярами бота.
+-- Формат: id|status|signal_id|application_name источника|время в секундах
+CREATE OR REPLACE FUNCTION anonac.notify_userdata_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify(
+        'anonac_userdata',
+        concat_ws('|', NEW.id, coalesce(NEW.status, ''), coalesce(NEW.signal_id::text, ''),
+                  coalesce(current_setting('application_name', true), ''),
+                  extract(epoch FROM clock_timestamp()))
+    );
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER userdata_notify_change
+    AFTER UPDATE OF status, signal_id ON anonac.userdata
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status OR OLD.signal_id IS DISTINCT FROM NEW.signal_id)
+    EXECUTE FUNCTION anonac.notify_userdata_change();
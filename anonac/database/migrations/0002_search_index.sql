@@ -0,0 +1,7 @@
+-- migrate: no-transaction
+-- Частичный индекс по ждущим пользователям: матчер и восстановление очереди
+-- читают только строки со статусом 'search', упорядоченные по update_at,
+-- и стоимость не растёт с общим числом зарегистрированных пользователей.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS userdata_search_idx
+    ON anonac.userdata (update_at)
+    WHERE status = 'search';
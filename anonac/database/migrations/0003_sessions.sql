@@ -0,0 +1,22 @@
+-- Одна строка на диалог. signal_id в userdata остаётся для быстрого
+-- поиска собеседника при пересылке, а история диалогов хранится здесь.
+CREATE TABLE IF NOT EXISTS anonac.sessions (
+    id BIGSERIAL PRIMARY KEY,
+    user_a BIGINT NOT NULL REFERENCES anonac.userdata(id) ON DELETE CASCADE,
+    user_b BIGINT NOT NULL REFERENCES anonac.userdata(id) ON DELETE CASCADE,
+    started_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    ended_at TIMESTAMP,                               -- NULL, пока диалог идёт
+    ended_by BIGINT                                   -- Кто завершил диалог
+);
+
+-- Открытые диалоги ищутся по любому из собеседников при их завершении.
+CREATE INDEX IF NOT EXISTS sessions_open_user_a_idx ON anonac.sessions (user_a) WHERE ended_at IS NULL;
+CREATE INDEX IF NOT EXISTS sessions_open_user_b_idx ON anonac.sessions (user_b) WHERE ended_at IS NULL;
+
+-- Открываем диалоги для пар, которые уже общаются.
+INSERT INTO anonac.sessions (user_a, user_b, started_at)
+SELECT a.id, a.signal_id, a.update_at
+FROM anonac.userdata a
+JOIN anonac.userdata b ON b.id = a.signal_id AND b.signal_id = a.id
+WHERE a.status = 'active' AND b.status = 'active' AND a.id < b.id
+  AND NOT EXISTS (SELECT 1 FROM anonac.sessions s WHERE s.ended_at IS NULL AND s.user_a = a.id);
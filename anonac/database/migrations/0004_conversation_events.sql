@@ -0,0 +1,15 @@
+-- Журнал событий диалогов для аналитики. Пишется пачками через COPY,
+-- поэтому без внешних ключей и лишних индексов.
+--   match   — пара соединена, detail: источник ('queue' или 'claim')
+--   message — сообщение переслано собеседнику, detail: тип содержимого
+--   end     — диалог завершён пользователем user_id, detail: команда
+CREATE TABLE IF NOT EXISTS anonac.conversation_events (
+    created_at TIMESTAMPTZ NOT NULL,
+    kind TEXT NOT NULL,
+    user_id BIGINT NOT NULL,
+    partner_id BIGINT,
+    detail TEXT
+);
+
+CREATE INDEX IF NOT EXISTS conversation_events_created_at_idx
+    ON anonac.conversation_events USING BRIN (created_at);
@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- Частичный индекс по пользователям в диалоге для поиска простаивающих
+-- диалогов: update_at обновляется пачками при пересылке сообщений.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS userdata_active_idx
+    ON anonac.userdata (update_at)
+    WHERE status = 'active';
@@ -0,0 +1,12 @@
+-- Уведомления также об изменении пола, желаемого пола и интересов:
+-- ищущий пользователь должен перейти в новую корзину очереди поиска на
+-- всех экземплярах, а не только на том, где он сменил параметры.
+CREATE OR REPLACE TRIGGER userdata_notify_change
+    AFTER UPDATE OF status, signal_id, gender, search_gender, interests ON anonac.userdata
+    FOR EACH ROW
+    WHEN (OLD.status IS DISTINCT FROM NEW.status
+          OR OLD.signal_id IS DISTINCT FROM NEW.signal_id
+          OR OLD.gender IS DISTINCT FROM NEW.gender
+          OR OLD.search_gender IS DISTINCT FROM NEW.search_gender
+          OR OLD.interests IS DISTINCT FROM NEW.interests)
+    EXECUTE FUNCTION anonac.notify_userdata_change();
@@ -1,77 +1,226 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
 from aiogram import Router, types
+from aiogram.methods import (
+    SendAnimation, SendDocument, SendMediaGroup, SendMessage, SendPhoto, SendSticker,
+    SendVideo, SendVideoNote, SendVoice, TelegramMethod,
+)
 from anonac.database.controller import UserController
+from anonac.services.events import EVENT_MESSAGE, EventRecorder
+from anonac.services.sender import SendScheduler, LANE_RELAY
+from anonac.metrics import RELAY_MESSAGES
 import anonac.messages
 import logging
 
 logger = logging.getLogger(__name__)
 
-def register_chat_handlers(user_controller: UserController) -> Router:
+
+def build_relay_method(message: types.Message, signal_id: int) -> Optional[TelegramMethod]:
+    if message.text:
+        return SendMessage(chat_id=signal_id, text=message.text)
+    elif message.photo:
+        photo = message.photo[-1]
+        return SendPhoto(
+            chat_id=signal_id,
+            photo=photo.file_id,
+            caption=message.caption,
+            has_spoiler=True
+        )
+    elif message.video:
+        return SendVideo(
+            chat_id=signal_id,
+            video=message.video.file_id,
+            caption=message.caption
+        )
+    elif message.voice:
+        return SendVoice(
+            chat_id=signal_id,
+            voice=message.voice.file_id,
+            caption=message.caption
+        )
+    elif message.video_note:
+        return SendVideoNote(
+            chat_id=signal_id,
+            video_note=message.video_note.file_id
+        )
+    elif message.document:
+        return SendDocument(
+            chat_id=signal_id,
+            document=message.document.file_id,
+            caption=message.caption
+        )
+    elif message.sticker:
+        return SendSticker(
+            chat_id=signal_id,
+            sticker=message.sticker.file_id
+        )
+    elif message.animation:
+        return SendAnimation(
+            chat_id=signal_id,
+            animation=message.animation.file_id,
+            caption=message.caption
+        )
+    return None
+
+
+def build_album_item(message: types.Message):
+    if message.photo:
+        return types.InputMediaPhoto(
+            media=message.photo[-1].file_id,
+            caption=message.caption,
+            has_spoiler=True
+        )
+    elif message.video:
+        return types.InputMediaVideo(
+            media=message.video.file_id,
+            caption=message.caption,
+            has_spoiler=message.has_media_spoiler
+        )
+    elif message.document:
+        return types.InputMediaDocument(
+            media=message.document.file_id,
+            caption=message.caption
+        )
+    elif message.audio:
+        return types.InputMediaAudio(
+            media=message.audio.file_id,
+            caption=message.caption
+        )
+    return None
+
+
+class MediaGroupBuffer:
+    """
+    Собирает сообщения одного альбома (media_group_id) в течение window секунд
+    и передаёт их в flush одной пачкой, упорядоченной по message_id.
+    """
+
+    MAX_SIZE = 10
+
+    def __init__(self, flush: Callable[[List[types.Message]], Awaitable[None]], window: float = 0.5):
+        self.flush = flush
+        self.window = window
+        self._groups: Dict[Tuple[int, str], List[types.Message]] = {}
+        self._timers: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._tasks = set()
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def add(self, message: types.Message):
+        key = (message.chat.id, message.media_group_id)
+        group = self._groups.setdefault(key, [])
+        group.append(message)
+        if len(group) >= self.MAX_SIZE:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            self._spawn(self._flush(key))
+        elif key not in self._timers:
+            self._timers[key] = self._spawn(self._flush_later(key))
+
+    async def _flush_later(self, key: Tuple[int, str]):
+        await asyncio.sleep(self.window)
+        self._timers.pop(key, None)
+        await self._flush(key)
+
+    async def _flush(self, key: Tuple[int, str]):
+        group = self._groups.pop(key, None)
+        if group:
+            await self.flush(sorted(group, key=lambda m: m.message_id))
+
+    async def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Отправляет собираемые альбомы, не дожидаясь окна, и ждёт окончания
+        всех отправок. Возвращает False, если за timeout они не завершились.
+        """
+        # Таймеры в _timers ещё ждут окна: отправка в них не начата.
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        for key in list(self._groups):
+            self._spawn(self._flush(key))
+        if not self._tasks:
+            return True
+        _, pending = await asyncio.wait(set(self._tasks), timeout=timeout)
+        return not pending
+
+
+def register_chat_handlers(
+    user_controller: UserController,
+    sender: SendScheduler,
+    recorder: EventRecorder,
+    media_group_window: float = 0.5,
+) -> Tuple[Router, MediaGroupBuffer]:
     router = Router()
 
+    async def resolve_partner(message: types.Message) -> Optional[int]:
+        signal_id = None
+        if await user_controller.get_status(message.from_user.id) == "active":
+            signal_id = await user_controller.get_signal_id(message.from_user.id)
+        if signal_id is None:
+            await sender.send_text(message.chat.id, anonac.messages.NULL_SIGNAL_ERROR)
+        return signal_id
+
+    async def relay_album(messages: List[types.Message]):
+        first = messages[0]
+        signal_id = None
+        try:
+            signal_id = await resolve_partner(first)
+            if signal_id is None:
+                return
+
+            items = [(message, build_album_item(message)) for message in messages]
+            items = [(message, item) for message, item in items if item is not None]
+            # sendMediaGroup принимает от 2 до 10 элементов: один элемент
+            # (неполный альбом) отправляется обычным сообщением.
+            method = None
+            if len(items) >= 2:
+                method = SendMediaGroup(chat_id=signal_id, media=[item for _, item in items])
+            elif items:
+                method = build_relay_method(items[0][0], signal_id)
+            if method is None:
+                await sender.send_text(first.chat.id, "Тип сообщения не поддерживается.")
+                return
+
+            await sender.send(method, LANE_RELAY)
+            for message, _ in items:
+                RELAY_MESSAGES.inc(message.content_type)
+                recorder.record(EVENT_MESSAGE, message.from_user.id, signal_id, message.content_type)
+            user_controller.touch(first.from_user.id)
+        except Exception as e:
+            logger.error("Ошибка пересылки альбома от %s к %s: %s", first.from_user.id, signal_id, e)
+            await sender.send_text(first.chat.id, "Ошибка при отправке сообщения собеседнику.")
+
+    albums = MediaGroupBuffer(relay_album, media_group_window)
+
     @router.message()
     async def relay_message(message: types.Message):
-        try:
-            user = message.from_user
+        if message.media_group_id:
+            albums.add(message)
+            return
 
-            current_user_status = await user_controller.get_status(user.id)
+        user = message.from_user
+        signal_id = None
+        try:
+            signal_id = await resolve_partner(message)
+            if signal_id is None:
+                return
 
-            if current_user_status != "active":
-                await message.answer(anonac.messages.NULL_SIGNAL_ERROR)
+            method = build_relay_method(message, signal_id)
+            if method is None:
+                await sender.send_text(message.chat.id, "Тип сообщения не поддерживается.")
                 return
 
-            signal = await user_controller.get_signal(user.id)
-
-            signal_id = signal["id"]
-
-
-            if message.text:
-                await message.bot.send_message(signal_id, message.text)
-            elif message.photo:
-                photo = message.photo[-1]
-                await message.bot.send_photo(
-                    signal_id,
-                    photo.file_id,
-                    caption=message.caption,
-                    has_spoiler=True
-                )
-            elif message.video:
-                await message.bot.send_video(
-                    signal_id,
-                    message.video.file_id,
-                    caption=message.caption
-                )
-            elif message.voice:
-                await message.bot.send_voice(
-                    signal_id,
-                    message.voice.file_id,
-                    caption=message.caption
-                )
-            elif message.video_note:
-                await message.bot.send_video_note(
-                    signal_id,
-                    message.video_note.file_id
-                )
-            elif message.document:
-                await message.bot.send_document(
-                    signal_id,
-                    message.document.file_id,
-                    caption=message.caption
-                )
-            elif message.sticker:
-                await message.bot.send_sticker(
-                    signal_id,
-                    message.sticker.file_id
-                )
-            elif message.animation:
-                await message.bot.send_animation(
-                    signal_id,
-                    message.animation.file_id,
-                    caption=message.caption
-                )
-            else:
-                await message.answer("Тип сообщения не поддерживается.")
+            await sender.send(method, LANE_RELAY)
+            RELAY_MESSAGES.inc(message.content_type)
+            recorder.record(EVENT_MESSAGE, user.id, signal_id, message.content_type)
+            user_controller.touch(user.id)
         except Exception as e:
-            logger.error(f"Ошибка пересылки сообщения от {user.id} к {signal_id}: {e}")
-            await message.answer("Ошибка при отправке сообщения собеседнику.")
+            logger.error("Ошибка пересылки сообщения от %s к %s: %s", user.id, signal_id, e)
+            await sender.send_text(message.chat.id, "Ошибка при отправке сообщения собеседнику.")
 
-    return router
\ No newline at end of file
+    return router, albums
@@ -1,110 +1,203 @@
-from aiogram import Router, types
-from aiogram.filters.command import Command
+from aiogram import F, Router, types
+from aiogram.filters.command import Command, CommandObject
+from aiogram.methods import AnswerCallbackQuery, EditMessageText
 import anonac.messages
 from anonac.database.controller import UserController
+from anonac.services.events import EVENT_END, EventRecorder
+from anonac.services.search_queue import SearchQueue
+from anonac.services.sender import LANE_SYSTEM, SendScheduler
 import logging
 
 logger = logging.getLogger(__name__)
 
-def register_handlers(user_controller: UserController) -> Router:
+MAX_INTERESTS = 10
+MAX_INTEREST_LENGTH = 32
+
+
+def parse_interests(args: str) -> list:
+    interests = []
+    for item in args.split(","):
+        interest = item.strip().lower()[:MAX_INTEREST_LENGTH]
+        if interest and interest not in interests:
+            interests.append(interest)
+    return interests[:MAX_INTERESTS]
+
+
+SEARCH_GENDER_ARGS = {
+    "male": "male", "m": "male", "парень": "male", "м": "male",
+    "female": "female", "f": "female", "девушка": "female", "ж": "female",
+    "any": None, "любой": None,
+}
+
+
+def gender_keyboard(step: str, options: dict) -> types.InlineKeyboardMarkup:
+    return types.InlineKeyboardMarkup(inline_keyboard=[[
+        types.InlineKeyboardButton(text=label, callback_data=f"gender:{step}:{value or 'any'}")
+        for value, label in options.items()
+    ]])
+
+def register_handlers(
+    user_controller: UserController,
+    search_queue: SearchQueue,
+    sender: SendScheduler,
+    recorder: EventRecorder,
+) -> Router:
     router = Router()
 
+    async def enqueue(user_id: int):
+        profile = await user_controller.get_search_profile(user_id)
+        if profile:
+            search_queue.push_profile(user_id, profile)
+        else:
+            search_queue.push(user_id)
+
     @router.message(Command("start"))
     async def cmd_start(message: types.Message):
+        # Пользователь уже зарегистрирован RegistrationMiddleware.
         try:
             user = message.from_user
-            await message.answer(anonac.messages.START)
-
-            success = await user_controller.register_user(user.id, user.username)
-            if success:
-                logger.info(f"Пользователь {user.id} успешно зарегистрирован.")
-            else:
-                logger.info(f"Пользователь {user.id} уже зарегистрирован.")
+            await sender.send_text(message.chat.id, anonac.messages.START)
         except Exception as e:
-            logger.error(f"Ошибка при обработке команды /start. USER({user.id}): {e}")
+            logger.error("Ошибка при обработке команды /start. USER(%s): %s", user.id, e)
 
 
     @router.message(Command("search"))
-    async def cmd_search(message: types.Message):
+    async def cmd_search(message: types.Message, command: CommandObject):
             try:
                 user = message.from_user
                 current_user_status = await user_controller.get_status(user.id)
 
                 if current_user_status == "unactive":
-                    await message.answer(anonac.messages.SEARCH)
+                    if command.args:
+                        wanted = command.args.strip().lower()
+                        if wanted not in SEARCH_GENDER_ARGS:
+                            await sender.send_text(message.chat.id, anonac.messages.SEARCH_GENDER_ERROR)
+                            return
+                        await user_controller.set_search_gender(user.id, SEARCH_GENDER_ARGS[wanted])
+
+                    await sender.send_text(message.chat.id, anonac.messages.SEARCH)
                     await user_controller.set_status(user.id, "search")
+                    await enqueue(user.id)
 
                 elif current_user_status == "active":
-                    await message.answer(anonac.messages.SEARCH_ERROR_ACTIVE)
+                    await sender.send_text(message.chat.id, anonac.messages.SEARCH_ERROR_ACTIVE)
                 
                 else:
-                    await message.answer(anonac.messages.SEARCH_ERROR_SEARCH)
+                    await sender.send_text(message.chat.id, anonac.messages.SEARCH_ERROR_SEARCH)
   
             except Exception as e:
-                logger.error(f"Ошибка при обработке команды /search. USER({user.id}): {e}")
+                logger.error("Ошибка при обработке команды /search. USER(%s): %s", user.id, e)
 
     @router.message(Command("stop"))
     async def cmd_stop(message: types.Message):         
         try:
             user = message.from_user
 
+            previous_status = None
             if await user_controller.get_status(user.id) == "active":
-                signal = await user_controller.get_signal(user.id)
+                previous_status, signal_id = await user_controller.end_chat(user.id)
 
-                await user_controller.set_status([user.id, signal["id"]], "unactive")
-                await user_controller.set_signal([user.id, signal["id"]], None)
-
-                await message.answer(anonac.messages.STOP_USER)
-                await message.bot.send_message(signal["id"], anonac.messages.STOP_SIGNAL) 
+            if previous_status == "active":
+                recorder.record(EVENT_END, user.id, signal_id, "stop")
+                await sender.send_text(message.chat.id, anonac.messages.STOP_USER)
+                if signal_id is not None:
+                    await sender.send_text(signal_id, anonac.messages.STOP_SIGNAL)
             else:
-                await message.answer(anonac.messages.STOP_ERROR)
+                await sender.send_text(message.chat.id, anonac.messages.STOP_ERROR)
     
         except Exception as e:
-            logger.error(f"Ошибка при обработке команды /stop. USER({user.id}): {e}")
+            logger.error("Ошибка при обработке команды /stop. USER(%s): %s", user.id, e)
 
-    @router.message(Command("stop"))
-    async def cmd_stop(message: types.Message):         
+    @router.message(Command("next"))
+    async def cmd_next(message: types.Message):         
         try:
             user = message.from_user
 
-            if await user_controller.get_status(user.id) == "active":
-                signal = await user_controller.get_signal(user.id)
-
-                await user_controller.set_status([user.id, signal["id"]], "unactive")
-                await user_controller.set_signal([user.id, signal["id"]], None)
-
-                await message.answer(anonac.messages.STOP_USER)
-                await message.bot.send_message(signal["id"], anonac.messages.STOP_SIGNAL) 
+            previous_status = None
+            if await user_controller.get_status(user.id) in ("active", "unactive"):
+                previous_status, signal_id = await user_controller.end_chat_and_requeue(user.id)
+
+            if previous_status in ("active", "unactive"):
+                if previous_status == "active":
+                    recorder.record(EVENT_END, user.id, signal_id, "next")
+                await enqueue(user.id)
+                await sender.send_text(message.chat.id, anonac.messages.SEARCH)
+                if signal_id is not None:
+                    await sender.send_text(signal_id, anonac.messages.STOP_SIGNAL)
             else:
-                await message.answer(anonac.messages.STOP_ERROR)
+                await sender.send_text(message.chat.id, anonac.messages.STOP_ERROR)
     
         except Exception as e:
-            logger.error(f"Ошибка при обработке команды /stop. USER({user.id}): {e}")@router.message(Command("stop"))
-    
-    @router.message(Command("next"))
-    async def cmd_next(message: types.Message):         
+            logger.error("Ошибка при обработке команды /next. USER(%s): %s", user.id, e)
+
+    @router.message(Command("interests"))
+    async def cmd_interests(message: types.Message, command: CommandObject):
         try:
             user = message.from_user
 
-            current_user_status = await user_controller.get_status(user.id)
-
-            if current_user_status == "active":
-                signal = await user_controller.get_signal(user.id)
+            if not command.args:
+                interests = await user_controller.get_interests(user.id)
+                text = anonac.messages.INTERESTS_USAGE
+                if interests:
+                    text = anonac.messages.INTERESTS_CURRENT.format(interests=", ".join(interests)) + "\n" + text
+                await sender.send_text(message.chat.id, text)
+                return
+
+            interests = [] if command.args.strip() == "-" else parse_interests(command.args)
+            await user_controller.set_interests(user.id, interests)
+            if user.id in search_queue:
+                await enqueue(user.id)
+
+            if interests:
+                await sender.send_text(message.chat.id, anonac.messages.INTERESTS_SET.format(interests=", ".join(interests)))
+            else:
+                await sender.send_text(message.chat.id, anonac.messages.INTERESTS_CLEARED)
 
-                await user_controller.set_status(user.id, "search")
-                await user_controller.set_status(signal["id"], "unactive")
-                await user_controller.set_signal([user.id, signal["id"]], None)
+        except Exception as e:
+            logger.error("Ошибка при обработке команды /interests. USER(%s): %s", user.id, e)
 
-                await message.answer(anonac.messages.SEARCH)
-                await message.bot.send_message(signal["id"], anonac.messages.STOP_SIGNAL)
+    @router.message(Command("gender"))
+    async def cmd_gender(message: types.Message):
+        try:
+            await sender.send_text(
+                message.chat.id,
+                anonac.messages.GENDER_SELF,
+                reply_markup=gender_keyboard("self", {"male": "Я парень", "female": "Я девушка"})
+            )
+        except Exception as e:
+            logger.error("Ошибка при обработке команды /gender. USER(%s): %s", message.from_user.id, e)
 
-            elif current_user_status == "unactive":
-                await user_controller.set_status(user.id, "search")
-                await message.answer(anonac.messages.SEARCH)
+    @router.callback_query(F.data.startswith("gender:"))
+    async def gender_choice(callback: types.CallbackQuery):
+        user = callback.from_user
+        try:
+            _, step, value = callback.data.split(":")
+            value = None if value == "any" else value
+
+            if step == "self":
+                await user_controller.set_gender(user.id, value)
+                await sender.send(EditMessageText(
+                    chat_id=callback.message.chat.id,
+                    message_id=callback.message.message_id,
+                    text=anonac.messages.GENDER_WANT,
+                    reply_markup=gender_keyboard("want", {"male": "Парня", "female": "Девушку", None: "Неважно"})
+                ), LANE_SYSTEM)
             else:
-                await message.answer(anonac.messages.STOP_ERROR)
-    
+                await user_controller.set_search_gender(user.id, value)
+                profile = await user_controller.get_search_profile(user.id)
+                await sender.send(EditMessageText(
+                    chat_id=callback.message.chat.id,
+                    message_id=callback.message.message_id,
+                    text=anonac.messages.GENDER_SAVED.format(
+                        gender=anonac.messages.GENDER_LABELS[profile["gender"] if profile else None],
+                        wanted=anonac.messages.WANTED_LABELS[value],
+                    ),
+                ), LANE_SYSTEM)
+                if user.id in search_queue:
+                    await enqueue(user.id)
+
+            await sender.send(AnswerCallbackQuery(callback_query_id=callback.id), LANE_SYSTEM, chat_id=user.id)
         except Exception as e:
-            logger.error(f"Ошибка при обработке команды /next. USER({user.id}): {e}")
+            logger.error("Ошибка при выборе пола. USER(%s): %s", user.id, e)
 
     return router    
\ No newline at end of file
@@ -0,0 +1,111 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from typing import Dict, Optional, Tuple
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение и шаблон события."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "event": record.msg if isinstance(record.msg, str) else repr(record.msg),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Прореживает записи уровня INFO и ниже. Тип события — шаблон сообщения
+    (record.msg до подстановки аргументов), поэтому ограничение действует
+    на каждый вид событий отдельно. Предупреждения и ошибки не отбрасываются.
+
+    sample_rate — доля сохраняемых записей, rate_limit — не больше стольких
+    записей одного типа в секунду (0 — без ограничения).
+    """
+
+    def __init__(self, sample_rate: float = 1.0, rate_limit: float = 0.0, max_events: int = 10_000):
+        super().__init__()
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.max_events = max_events
+        self._windows: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self.dropped: Dict[str, int] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return self._drop(record)
+        if self.rate_limit > 0:
+            key = (record.name, record.msg)
+            second = int(time.monotonic())
+            window, count = self._windows.get(key, (second, 0))
+            if window != second:
+                window, count = second, 0
+            if count >= self.rate_limit:
+                return self._drop(record)
+            if key not in self._windows and len(self._windows) >= self.max_events:
+                self._windows.clear()
+            self._windows[key] = (window, count + 1)
+        return True
+
+    def _drop(self, record: logging.LogRecord) -> bool:
+        self.dropped[record.name] = self.dropped.get(record.name, 0) + 1
+        return False
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Кладёт запись в очередь как есть: сообщение форматируется уже в потоке
+    QueueListener, а не в цикле событий.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(
+    level: str = "INFO",
+    json_format: bool = False,
+    sample_rate: float = 1.0,
+    rate_limit: float = 0.0,
+) -> Tuple[logging.handlers.QueueListener, SamplingFilter]:
+    """
+    Настраивает корневой логгер: записи проходят прореживание и через
+    очередь передаются фоновому потоку, который пишет их в stderr.
+    Возвращает запущенный QueueListener (остановить при завершении) и фильтр.
+    """
+    stream = logging.StreamHandler()
+    stream.setFormatter(JsonFormatter() if json_format else logging.Formatter(TEXT_FORMAT))
+
+    sampling = SamplingFilter(sample_rate, rate_limit)
+    handler = _LazyQueueHandler(queue.SimpleQueue())
+    handler.addFilter(sampling)
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+    listener.start()
+    return listener, sampling
+
+
+def stop_logging(listener: Optional[logging.handlers.QueueListener]):
+    """Дописывает оставшиеся в очереди записи и останавливает фоновый поток."""
+    if listener is not None:
+        listener.stop()
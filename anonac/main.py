@@ -1,29 +1,190 @@
 import asyncio
+import logging
+import signal
+from contextlib import suppress
 from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from anonac.config import settings
 from anonac.database.controller import Database, UserController
+from anonac.database.cache import UserStateCache
 from anonac.handlers import commands, chat
+from anonac.logs import setup_logging, stop_logging
+from anonac.metrics import register_runtime_gauges, registry, start_metrics_server
+from anonac.middlewares.drain import InFlightMiddleware
+from anonac.middlewares.metrics import MetricsMiddleware
+from anonac.middlewares.registration import RegistrationMiddleware
+from anonac.middlewares.throttling import ThrottlingMiddleware, parse_limits
 from anonac.services.matchmaking import signal_controller
+from anonac.services.events import EventRecorder
+from anonac.services.search_queue import SearchQueue
+from anonac.services.sender import SendScheduler
+from anonac.services.state_sync import StateSync
+from anonac.services.sweeper import sweeper
+from anonac.services.warmup import load_known_users, load_runtime_state
+from anonac.services.webhook import run_webhook
+
+logger = logging.getLogger(__name__)
+
+def build_dispatcher(
+    user_controller: UserController,
+    search_queue: SearchQueue,
+    sender: SendScheduler,
+    recorder: EventRecorder,
+    registration: RegistrationMiddleware,
+    throttling: ThrottlingMiddleware,
+    in_flight: InFlightMiddleware,
+) -> Dispatcher:
+    dp = Dispatcher()
+    dp.update.outer_middleware(in_flight)
+    dp.update.outer_middleware(registration)
+    dp.message.outer_middleware(throttling)
+    dp.callback_query.outer_middleware(throttling)
+    dp.message.middleware(MetricsMiddleware())
+    dp.callback_query.middleware(MetricsMiddleware())
+
+    dp.include_router(commands.register_handlers(user_controller, search_queue, sender, recorder))
+    chat_router, albums = chat.register_chat_handlers(user_controller, sender, recorder, settings.media_group_window)
+    dp.include_router(chat_router)
+    # Нужен при остановке, чтобы дослать собираемые альбомы.
+    dp["albums"] = albums
+    return dp
 
 async def main():
-    db = Database(settings.database_url)
-    await db.connect()
+    log_listener, log_sampling = setup_logging(
+        settings.log_level, settings.log_json, settings.log_sample_rate, settings.log_rate_limit
+    )
+    registry.counter(
+        "anonac_log_dropped_total", "Записи журнала, отброшенные прореживанием, по логгеру.",
+        lambda: {(name,): count for name, count in log_sampling.dropped.items()}, ("logger",)
+    )
 
-    user_controller = UserController(db)
+    db = Database(settings.database_url, settings.instance_id)
+    try:
+        await db.connect()
+    except Exception:
+        stop_logging(log_listener)
+        raise
 
-    bot = Bot(token=settings.bot_token)
-    dp = Dispatcher()
-    
-    dp.include_router(commands.register_handlers(user_controller))
-    dp.include_router(chat.register_chat_handlers(user_controller))
+    user_cache = UserStateCache(settings.user_cache_size, settings.user_cache_ttl)
+    user_controller = UserController(db, user_cache)
+    search_queue = SearchQueue(settings.interest_match_wait)
 
+    session = None
+    if settings.telegram_api_url:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(settings.telegram_api_url))
+    bot = Bot(token=settings.bot_token, session=session)
+    sender = SendScheduler(
+        bot,
+        global_rate=settings.send_global_rate,
+        chat_rate=settings.send_chat_rate,
+        chat_burst=settings.send_chat_burst,
+        queue_size=settings.send_queue_size,
+    )
+    recorder = EventRecorder(
+        db,
+        batch_size=settings.events_batch_size,
+        flush_interval=settings.events_flush_interval,
+        max_buffer=settings.events_max_buffer,
+    )
+    registration = RegistrationMiddleware(user_controller)
+    throttling = ThrottlingMiddleware(parse_limits(settings.throttle_limits), settings.throttle_max_buckets)
+    in_flight = InFlightMiddleware()
+    dp = build_dispatcher(user_controller, search_queue, sender, recorder, registration, throttling, in_flight)
+
+    state_sync = StateSync(db, user_controller, search_queue, registration.known) if settings.state_sync else None
+    register_runtime_gauges(db, user_cache, search_queue, sender, recorder, registration, throttling, state_sync)
+    metrics_runner = None
+
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        with suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
+
+    tasks = []
+    warm_known = None
+    # До начала остановки запас времени нулевой: при ошибке запуска не ждём.
+    deadline = loop.time()
+    remaining = lambda: max(0.0, deadline - loop.time())
     try:
-        await asyncio.gather(
-            dp.start_polling(bot),
-            signal_controller(bot, user_controller)
-        )
+        if state_sync is not None:
+            await state_sync.start()
+        else:
+            await load_runtime_state(user_controller, search_queue, registration.known)
+        if settings.metrics_port:
+            metrics_runner = await start_metrics_server(settings.metrics_host, settings.metrics_port)
+        if settings.bot_mode == "webhook":
+            intake = run_webhook(
+                dp, bot,
+                host=settings.webhook_host,
+                port=settings.webhook_port,
+                path=settings.webhook_path,
+                health_path=settings.webhook_health_path,
+                secret_token=settings.webhook_secret,
+                public_url=settings.webhook_url,
+                max_in_flight=settings.webhook_max_in_flight,
+                stop=stop,
+            )
+        else:
+            intake = dp.start_polling(bot, handle_signals=False, close_bot_session=False)
+
+        sender.start()
+        recorder.start()
+        # Остальные известные ID дочитываются в фоне, не задерживая приём.
+        warm_known = asyncio.create_task(load_known_users(user_controller, registration.known))
+        tasks = [
+            asyncio.create_task(intake),
+            asyncio.create_task(signal_controller(
+                sender, user_controller, search_queue, recorder,
+                settings.matchmaking_claim_interval,
+                settings.matchmaking_claim_batch,
+                stop,
+            )),
+            asyncio.create_task(sweeper(
+                sender, user_controller, search_queue, recorder,
+                settings.sweep_interval,
+                settings.chat_idle_timeout,
+                settings.search_timeout,
+                settings.sweep_batch,
+                stop,
+            )),
+        ]
+        stop_task = asyncio.create_task(stop.wait())
+        done, _ = await asyncio.wait(tasks + [stop_task], return_when=asyncio.FIRST_COMPLETED)
+        stop_task.cancel()
+        for task in done:
+            if task is not stop_task and not task.cancelled() and task.exception() is not None:
+                logger.error("Фоновая задача завершилась с ошибкой: %s", task.exception())
+
+        # Остановка: сначала приём обновлений, затем обработка принятых,
+        # матчер и очистка, и только потом исходящая очередь и база.
+        logger.info("Остановка, ждём завершения обработки до %s с.", settings.shutdown_timeout)
+        deadline = loop.time() + settings.shutdown_timeout
+        stop.set()
+        search_queue.wake()
+        if settings.bot_mode != "webhook":
+            with suppress(RuntimeError, asyncio.TimeoutError):
+                await asyncio.wait_for(dp.stop_polling(), remaining())
+        if not await in_flight.wait_idle(remaining()):
+            logger.warning("Не завершено обновлений при остановке: %s", in_flight.in_flight)
+        # Собираемые альбомы отправляются сразу, пока исходящая очередь работает.
+        if not await dp["albums"].drain(remaining()):
+            logger.warning("Не все альбомы отправлены при остановке.")
+        await asyncio.wait(tasks, timeout=remaining())
     finally:
+        if warm_known is not None:
+            tasks.append(warm_known)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await sender.close(timeout=remaining())
+        await recorder.close()
+        await bot.session.close()
         await db.close()
+        stop_logging(log_listener)
 
 if __name__ == "__main__":
     asyncio.run(main())
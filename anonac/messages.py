@@ -7,7 +7,7 @@ START = ("👋 Привет! Это Анонимный чат Телеграма
 
 SEARCH = ("Ищем собеседника...")
 
-NULL_SIGNALs_ERROR = ("Вы не находитесь в активном диалоге.\n"
+NULL_SIGNAL_ERROR = ("Вы не находитесь в активном диалоге.\n"
               "\nДля поиска собеседника используйте команду /search")
 
 SEARCH_ERROR_ACTIVE = ("Вы уже находитесь в активном диаологе.\n"
@@ -28,10 +28,47 @@ STOP_SIGNAL = ("Собеседник оборвал с вами связь 😞\
 STOP_ERROR = ("Вы не находитесь в активном диалоге.\n"
               "\nДля поиска собеседника используйте команду /search")
 
+IDLE_STOP = ("Диалог завершён: в нём давно не было сообщений 💤\n"
+        "Напишите /search чтобы найти следующего собеседника\n"
+        "\n/interests — добавить интересы поиска")
+
+SEARCH_EXPIRED = ("Собеседник так и не нашёлся, поиск остановлен 😔\n"
+        "Напишите /search чтобы попробовать ещё раз\n"
+        "\n/interests — добавить интересы поиска")
 
 NEXT_ERROR_SEARCH = ("Вы уже начали поиск собеседника, пожалуйста подождите...")
 
 FOUND = ("Собеседник найден\n"
         "\n/next — искать нового собеседника\n"
         "/stop — закончить диалог\n"
-        "\n/interests — добавить интересы поиска")
\ No newline at end of file
+        "\n/interests — добавить интересы поиска")
+
+INTERESTS_USAGE = ("Укажите интересы через запятую, например:\n"
+        "/interests музыка, игры, кино\n"
+        "\nМы постараемся найти собеседника с общими интересами.\n"
+        "/interests - — очистить интересы")
+
+INTERESTS_CURRENT = ("Ваши интересы: {interests}\n")
+
+INTERESTS_SET = ("Интересы сохранены: {interests}")
+
+INTERESTS_CLEARED = ("Интересы очищены. Будем искать любого собеседника.")
+
+GENDER_SELF = ("Укажите ваш пол:")
+
+GENDER_WANT = ("Кого вы хотите искать?")
+
+GENDER_SAVED = ("Настройки сохранены ✅\n"
+        "\nВаш пол: {gender}\n"
+        "Ищем: {wanted}\n"
+        "\n/search — начать поиск")
+
+GENDER_LABELS = {"male": "парень", "female": "девушка", None: "не указан"}
+
+WANTED_LABELS = {"male": "парня", "female": "девушку", None: "любого собеседника"}
+
+SEARCH_GENDER_ERROR = ("Неизвестный фильтр поиска.\n"
+        "\n/search — любой собеседник\n"
+        "/search male — искать парня\n"
+        "/search female — искать девушку\n"
+        "\n/gender — указать свой пол и кого искать")
\ No newline at end of file
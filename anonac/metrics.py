@@ -0,0 +1,238 @@
+import abc
+import bisect
+import functools
+import logging
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+LabelValues = Tuple[str, ...]
+
+# Границы гистограмм задержек в секундах.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+WAIT_BUCKETS = (0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    @abc.abstractmethod
+    def render(self) -> List[str]:
+        """Строки значений метрики без заголовка."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам..., +Inf, сумма]
+        self._values: Dict[LabelValues, List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._values.get(labels)
+        if series is None:
+            series = self._values[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._values.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def total(self) -> int:
+        """Число наблюдений по всем меткам."""
+        return sum(self.count(*labels) for labels in self._values)
+
+    def render(self) -> List[str]:
+        lines = []
+        for labels, series in self._values.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets + (float("inf"),), series):
+                cumulative += hits
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+    def time(self, *labels: str):
+        """Декоратор корутины: измеряет время её выполнения."""
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.observe(time.perf_counter() - started, *labels)
+            return wrapper
+        return decorator
+
+
+class Gauge(_Metric):
+    """Значение снимается при каждом запросе метрик вызовом collect."""
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        collect: Optional[Callable[[], Union[float, Dict[LabelValues, float]]]] = None,
+    ):
+        super().__init__(name, documentation, labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        if self.collect is None:
+            return []
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_format_labels(self.label_names, k)} {v}" for k, v in values.items()]
+
+
+class CollectedCounter(Gauge):
+    """Монотонный счётчик, который ведёт сам объект; значение снимается вызовом collect."""
+
+    kind = "counter"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def gauge(self, name: str, documentation: str, collect: Callable, labels: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labels, collect))
+
+    def counter(self, name: str, documentation: str, collect: Callable, labels: Sequence[str] = ()) -> CollectedCounter:
+        return self.register(CollectedCounter(name, documentation, labels, collect))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                body = metric.render()
+            except Exception as e:
+                logger.error("Ошибка при сборе метрики %s: %s", metric.name, e)
+                continue
+            lines.extend(metric.header())
+            lines.extend(body)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HANDLER_LATENCY = registry.register(Histogram(
+    "anonac_handler_seconds", "Время обработки обновления обработчиком.", ("handler",)))
+DB_QUERY_LATENCY = registry.register(Histogram(
+    "anonac_db_query_seconds", "Время выполнения методов UserController, обращающихся к базе.", ("method",)))
+RELAY_MESSAGES = registry.register(Counter(
+    "anonac_relay_messages_total", "Пересланные собеседнику сообщения по типу содержимого.", ("media_type",)))
+MATCH_WAIT = registry.register(Histogram(
+    "anonac_match_wait_seconds", "Время от начала поиска до соединения пары.", buckets=WAIT_BUCKETS))
+MATCHES = registry.register(Counter(
+    "anonac_matches_total", "Соединённые пары.", ("source",)))
+THROTTLED = registry.register(Counter(
+    "anonac_throttled_total", "События, отклонённые ограничением частоты, по типу.", ("kind",)))
+
+
+def timed_query(func):
+    """Декоратор методов UserController: время запроса по имени метода."""
+    return DB_QUERY_LATENCY.time(func.__name__.lstrip("_"))(func)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднимает HTTP-сервер с метриками в текстовом формате Prometheus на /metrics."""
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(
+            body=registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info("Метрики доступны на http://%s:%s/metrics", host, port)
+    return runner
+
+
+def register_runtime_gauges(db, user_cache, search_queue, sender, recorder, registration, throttling, state_sync=None):
+    """Метрики состояния, которые снимаются в момент запроса /metrics."""
+    pool_stats = lambda: {
+        ("size",): db.pool.get_size(),
+        ("idle",): db.pool.get_idle_size(),
+        ("max",): db.pool.get_max_size(),
+    }
+    registry.gauge("anonac_db_pool_connections", "Соединения пула asyncpg.", pool_stats, ("state",))
+    registry.gauge("anonac_db_pool_in_use", "Занятые соединения пула asyncpg.",
+                   lambda: db.pool.get_size() - db.pool.get_idle_size())
+
+    registry.gauge("anonac_search_queue_depth", "Пользователи в поиске по корзинам (пол, желаемый пол).",
+                   lambda: {(str(g), str(w)): s["depth"] for (g, w), s in search_queue.bucket_stats().items()},
+                   ("gender", "wanted"))
+    registry.gauge("anonac_search_queue_oldest_wait_seconds", "Ожидание самого давнего пользователя в корзине.",
+                   lambda: {(str(g), str(w)): s["oldest_wait"] for (g, w), s in search_queue.bucket_stats().items()},
+                   ("gender", "wanted"))
+
+    registry.gauge("anonac_user_cache", "Размер и счётчики кэша состояния пользователей.",
+                   lambda: {(k,): v for k, v in user_cache.stats().items()}, ("stat",))
+
+    sender_stats = lambda: {(lane, k): v for lane, stats in sender.stats().items() for k, v in stats.items()}
+    registry.gauge("anonac_sender", "Очередь исходящих запросов по полосам.", sender_stats, ("lane", "stat"))
+    registry.counter("anonac_sender_retry_after_total", "Ответы Telegram с retry_after.", lambda: sender.retry_after)
+
+    registry.gauge("anonac_known_users", "ID пользователей, известных без обращения к базе.",
+                   lambda: len(registration.known))
+    registry.counter("anonac_auto_registered_total", "Пользователи, зарегистрированные middleware.",
+                   lambda: registration.registered)
+
+    registry.gauge("anonac_throttle_buckets", "Токен-бакеты ограничения частоты в памяти.",
+                   lambda: len(throttling))
+
+    registry.gauge("anonac_events", "Буфер и счётчики журнала событий диалогов.",
+                   lambda: {(k,): v for k, v in recorder.stats().items()}, ("stat",))
+
+    if state_sync is not None:
+        registry.gauge("anonac_state_sync", "События синхронизации и задержка уведомлений в секундах.",
+                       lambda: {(k,): v for k, v in state_sync.stats().items()}, ("stat",))
@@ -0,0 +1,32 @@
+from typing import Any, Awaitable, Callable, Dict, Set
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from anonac.database.controller import UserController
+
+
+class RegistrationMiddleware(BaseMiddleware):
+    """
+    Регистрирует незнакомых пользователей до обработки обновления;
+    регистрируется как outer middleware на dp.update. Уже известные ID
+    хранятся в памяти (заполняются load_known_users в фоне после запуска),
+    поэтому для них обращения к базе нет.
+    """
+
+    def __init__(self, user_controller: UserController):
+        self.user_controller = user_controller
+        self.known: Set[int] = set()
+        self.registered = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is not None and not user.is_bot and user.id not in self.known:
+            added = await self.user_controller.register_user(user.id, user.username)
+            if added is not None:
+                self.known.add(user.id)
+                self.registered += added
+        return await handler(event, data)
@@ -0,0 +1,122 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, Message, TelegramObject
+from anonac.metrics import THROTTLED
+from anonac.services.sender import TokenBucket
+
+# Лимит: (токенов в секунду, запас).
+Limit = Tuple[float, float]
+# Сколько секунд помнить решение по альбому: части альбома приходят подряд.
+GROUP_TTL = 10.0
+
+
+def parse_limits(spec: str) -> Dict[str, Limit]:
+    """Разбирает строку вида "default=1/5,sticker=0.3/3" в {тип: (rate, burst)}."""
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        kind, value = item.split("=")
+        rate, burst = value.split("/")
+        limits[kind.strip()] = (float(rate), float(burst))
+    return limits
+
+
+def event_kind(event: TelegramObject) -> str:
+    if isinstance(event, CallbackQuery):
+        return "callback"
+    if isinstance(event, Message):
+        if event.text and event.text.startswith("/"):
+            return "command"
+        return event.content_type
+    return "default"
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Ограничивает частоту сообщений и нажатий кнопок каждого пользователя
+    токен-бакетом на пару (пользователь, тип события); регистрируется как
+    outer middleware на dp.message и dp.callback_query. Отклонённое событие
+    не доходит до обработчиков и не вызывает ни запросов к базе, ни ответов.
+
+    Бакеты хранятся в LRU; бакет, который простоял достаточно, чтобы
+    полностью восстановиться, удаляется без потери состояния.
+
+    Альбом расходует один токен: решение по первой части запоминается по
+    media_group_id, и остальные части пропускаются или отклоняются вместе с ней.
+    """
+
+    def __init__(self, limits: Dict[str, Limit], max_buckets: int = 100_000):
+        self.limits = limits
+        self.default = limits.get("default", (1.0, 5.0))
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[Tuple[int, str], TokenBucket]" = OrderedDict()
+        # (пользователь, media_group_id) -> (пропущен ли альбом, время первой части).
+        self._groups: "OrderedDict[Tuple[int, str], Tuple[bool, float]]" = OrderedDict()
+        self.throttled = 0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: Tuple[int, str], kind: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            self._evict(now)
+            rate, burst = self.limits.get(kind, self.default)
+            bucket = TokenBucket(rate, burst, now)
+            self._buckets[key] = bucket
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _evict(self, now: float):
+        # За один вызов удаляется не больше двух бакетов: O(1) в среднем.
+        for _ in range(2):
+            if not self._buckets:
+                break
+            key, bucket = next(iter(self._buckets.items()))
+            full = now - bucket.updated >= (bucket.capacity - bucket.tokens) / bucket.rate
+            if not full and len(self._buckets) < self.max_buckets:
+                break
+            del self._buckets[key]
+
+    def _admit(self, user_id: int, kind: str, now: float) -> bool:
+        return self._bucket((user_id, kind), kind, now).take(now) <= 0
+
+    def _admit_group(self, user_id: int, group_id: str, kind: str, now: float) -> bool:
+        while self._groups:
+            key, (_, seen) = next(iter(self._groups.items()))
+            if now - seen < GROUP_TTL and len(self._groups) < self.max_buckets:
+                break
+            del self._groups[key]
+        key = (user_id, group_id)
+        decision = self._groups.get(key)
+        if decision is None:
+            decision = (self._admit(user_id, kind, now), now)
+            self._groups[key] = decision
+        return decision[0]
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user is None:
+            return await handler(event, data)
+
+        kind = event_kind(event)
+        now = time.monotonic()
+        group_id = event.media_group_id if isinstance(event, Message) else None
+        if group_id is not None:
+            admitted = self._admit_group(user.id, group_id, kind, now)
+        else:
+            admitted = self._admit(user.id, kind, now)
+        if not admitted:
+            self.throttled += 1
+            THROTTLED.inc(kind)
+            return None
+        return await handler(event, data)
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Optional, Tuple
+from anonac.database.controller import Database
+
+logger = logging.getLogger(__name__)
+
+# Виды событий диалога.
+EVENT_MATCH = "match"
+EVENT_MESSAGE = "message"
+EVENT_END = "end"
+
+COLUMNS = ("created_at", "kind", "user_id", "partner_id", "detail")
+Event = Tuple[datetime, str, int, Optional[int], Optional[str]]
+
+
+class EventRecorder:
+    """
+    Журнал событий диалогов для аналитики: соединения пар, сообщения по типам
+    и завершения диалогов. record() только добавляет событие в буфер, а
+    фоновая задача пишет накопленное одним COPY, когда набирается batch_size
+    событий или проходит flush_interval секунд.
+
+    Буфер ограничен max_buffer событиями: если база не успевает, новые
+    события отбрасываются и учитываются в dropped, а неудачная пачка
+    возвращается в буфер, пока для неё есть место.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        max_buffer: int = 50_000,
+    ):
+        self.db = db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer: Deque[Event] = deque()
+        self._full = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def record(self, kind: str, user_id: int, partner_id: Optional[int] = None, detail: Optional[str] = None):
+        if len(self._buffer) >= self.max_buffer:
+            self.dropped += 1
+            return
+        self._buffer.append((datetime.now(timezone.utc), kind, user_id, partner_id, detail))
+        if len(self._buffer) >= self.batch_size:
+            self._full.set()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Останавливает фоновую запись и сбрасывает остаток буфера."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        while self._buffer:
+            if not await self.flush():
+                break
+        if self._buffer:
+            logger.warning("Не записано событий при остановке: %s", len(self._buffer))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            while self._buffer:
+                if not await self.flush():
+                    # База не отвечает: следующая попытка не раньше flush_interval.
+                    await asyncio.sleep(self.flush_interval)
+                    break
+                if len(self._buffer) < self.batch_size:
+                    break
+
+    async def flush(self) -> bool:
+        """Пишет в базу одну пачку событий. Возвращает False при ошибке."""
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+        if not batch:
+            return True
+        try:
+            async with self.db.pool.acquire() as conn:
+                await conn.copy_records_to_table(
+                    "conversation_events", schema_name="anonac", columns=COLUMNS, records=batch
+                )
+        except asyncio.CancelledError:
+            self._buffer.extendleft(reversed(batch))
+            raise
+        except Exception as e:
+            self.failed_flushes += 1
+            room = self.max_buffer - len(self._buffer)
+            kept = batch[:max(0, room)]
+            self._buffer.extendleft(reversed(kept))
+            self.dropped += len(batch) - len(kept)
+            logger.error("Ошибка при записи событий диалогов (%s шт.): %s", len(batch), e)
+            return False
+        self.written += len(batch)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "buffered": len(self._buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed_flushes": self.failed_flushes,
+        }
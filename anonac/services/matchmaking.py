@@ -1,30 +1,74 @@
 import asyncio
-import random
+import logging
+from typing import Optional
 from anonac.database.controller import UserController
+from anonac.services.events import EVENT_MATCH, EventRecorder
+from anonac.services.search_queue import SearchQueue
+from anonac.services.sender import SendScheduler
 from anonac.messages import FOUND
-from aiogram import Bot
+from anonac.metrics import MATCH_WAIT, MATCHES
 
+logger = logging.getLogger(__name__)
 
-async def signal_controller(bot: Bot, user_controller: UserController):
-    while True:
-        try:
-            users = await user_controller.get_status_list("search")
-            if len(users) >= 2:
-                
-                signal_1, signal_2 = random.sample(users, 2)
-                id_1 = signal_1["id"]
-                id_2 = signal_2["id"]
+# Пауза перед повтором, если ни одна пара из пачки не была соединена.
+RETRY_DELAY = 0.5
 
-                await user_controller.set_signal(id_1, id_2)
-                await user_controller.set_signal(id_2, id_1)
 
-                await user_controller.set_status([id_1, id_2], "active")
+async def signal_controller(
+    sender: SendScheduler,
+    user_controller: UserController,
+    search_queue: SearchQueue,
+    recorder: EventRecorder,
+    claim_interval: float = 0,
+    claim_batch: int = 100,
+    stop: Optional[asyncio.Event] = None,
+):
+    """
+    Соединяет пользователей из очереди поиска. При claim_interval > 0 матчер
+    также периодически забирает ждущих пользователей прямо из базы, чтобы
+    находить пары между несколькими запущенными экземплярами бота.
+    После stop матчер завершает текущий проход, включая уведомления, и
+    выходит; чтобы разбудить его, нужно вызвать search_queue.wake().
+    """
+    while stop is None or not stop.is_set():
+        timeout = search_queue.next_deadline_in()
+        if claim_interval > 0:
+            timeout = claim_interval if timeout is None else min(timeout, claim_interval)
 
+        if timeout is None:
+            await search_queue.wait()
+        else:
+            try:
+                await asyncio.wait_for(search_queue.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
 
-                await bot.send_message(id_1, FOUND)
-                await bot.send_message(id_2, FOUND)
+        pairs, waiting = [], []
+        candidates = search_queue.pop_pairs()
+        if candidates:
+            pairs, waiting = await user_controller.pair_users(candidates)
+            search_queue.restore(waiting)
+            for id_1, id_2 in pairs:
+                MATCH_WAIT.observe(search_queue.waited(id_1) or 0.0)
+                MATCH_WAIT.observe(search_queue.waited(id_2) or 0.0)
+                recorder.record(EVENT_MATCH, id_1, id_2, "queue")
+            MATCHES.inc("queue", amount=len(pairs))
 
-        except Exception as e:
-            print(f"[Matchmaking Error] {e}")
+        if claim_interval > 0:
+            claimed = await user_controller.claim_pairs(claim_batch, search_queue.interest_wait)
+            for id_1, id_2 in claimed:
+                search_queue.remove(id_1)
+                search_queue.remove(id_2)
+                recorder.record(EVENT_MATCH, id_1, id_2, "claim")
+            MATCHES.inc("claim", amount=len(claimed))
+            pairs.extend(claimed)
 
-        await asyncio.sleep(0.1)
\ No newline at end of file
+        for id_1, id_2 in pairs:
+            try:
+                await sender.send_text(id_1, FOUND)
+                await sender.send_text(id_2, FOUND)
+            except Exception as e:
+                logger.error("[Matchmaking Error] Ошибка при уведомлении %s и %s: %s", id_1, id_2, e)
+
+        if candidates and not pairs and waiting:
+            await asyncio.sleep(RETRY_DELAY)
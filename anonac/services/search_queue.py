@@ -0,0 +1,278 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+GENDERS = ("male", "female")
+
+# Корзина ожидания: (свой пол, желаемый пол собеседника), None — не указан.
+BucketKey = Tuple[Optional[str], Optional[str]]
+
+
+def compatible_buckets(gender: Optional[str], wanted: Optional[str]) -> List[BucketKey]:
+    """Корзины, пользователи из которых подходят пользователю с полом gender, ищущему wanted."""
+    partner_genders = (wanted,) if wanted else GENDERS + (None,)
+    partner_wants = (None, gender) if gender else (None,)
+    return [(g, w) for g in partner_genders for w in partner_wants]
+
+
+class _Waiter:
+    __slots__ = ("enqueued_at", "interests", "bucket")
+
+    def __init__(self, enqueued_at: float, interests: frozenset, bucket: BucketKey):
+        self.enqueued_at = enqueued_at
+        self.interests = interests
+        self.bucket = bucket
+
+
+class _BucketStats:
+    __slots__ = ("matched", "wait_total")
+
+    def __init__(self):
+        self.matched = 0
+        self.wait_total = 0.0
+
+
+class SearchQueue:
+    """
+    Очередь пользователей в поиске. Обработчики команд добавляют в неё
+    пользователей, а матчер просыпается сразу, как только есть пара.
+
+    Ждущие разбиты на корзины по (свой пол, желаемый пол), поэтому поиск
+    собеседника — это просмотр нескольких совместимых корзин, а не всех ждущих.
+
+    Пользователи с интересами сначала ищут собеседника с общим интересом
+    через индекс (интерес, корзина) -> ждущие пользователи и только после
+    interest_wait секунд соглашаются на любого совместимого собеседника.
+    Пользователи без интересов готовы к любому собеседнику сразу.
+    """
+
+    def __init__(self, interest_wait: float = 10.0):
+        self.interest_wait = interest_wait
+        self._waiting: "OrderedDict[int, _Waiter]" = OrderedDict()
+        self._buckets: Dict[BucketKey, "OrderedDict[int, None]"] = {}
+        self._index: Dict[Tuple[str, BucketKey], "OrderedDict[int, None]"] = {}
+        self._open: Dict[BucketKey, "OrderedDict[int, None]"] = {}
+        self._pending: Deque[Tuple[float, int]] = deque()
+        self._dirty: "OrderedDict[int, None]" = OrderedDict()
+        # Забранные последним pop_pairs: ожидающий и сколько он ждал до пары.
+        self._taken: Dict[int, Tuple[_Waiter, float]] = {}
+        self._stats: Dict[BucketKey, _BucketStats] = {}
+        self._changed: Optional[Set[int]] = None
+        self._ready = asyncio.Event()
+
+    def __len__(self) -> int:
+        return len(self._waiting)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._waiting
+
+    def push(
+        self,
+        user_id: int,
+        interests: Iterable[str] = (),
+        gender: Optional[str] = None,
+        wanted: Optional[str] = None,
+        enqueued_at: Optional[float] = None,
+    ):
+        """Добавляет пользователя в поиск или обновляет его интересы и фильтры."""
+        interests = frozenset(interests or ())
+        bucket = (gender, wanted)
+        if self._changed is not None:
+            self._changed.add(user_id)
+        waiter = self._waiting.get(user_id)
+        if waiter is None:
+            waiter = _Waiter(enqueued_at or time.monotonic(), interests, bucket)
+            self._waiting[user_id] = waiter
+        else:
+            self._unindex(user_id, waiter)
+            waiter.interests = interests
+            waiter.bucket = bucket
+
+        self._buckets.setdefault(bucket, OrderedDict())[user_id] = None
+        for interest in interests:
+            self._index.setdefault((interest, bucket), OrderedDict())[user_id] = None
+        if not interests or time.monotonic() - waiter.enqueued_at >= self.interest_wait:
+            self._open.setdefault(bucket, OrderedDict())[user_id] = None
+        else:
+            self._pending.append((waiter.enqueued_at + self.interest_wait, user_id))
+
+        self._dirty[user_id] = None
+        if len(self._waiting) >= 2:
+            self._ready.set()
+
+    def push_profile(self, user_id: int, profile: Any):
+        """Добавляет пользователя по записи с полями interests, gender и search_gender."""
+        self.push(user_id, profile["interests"], profile["gender"], profile["search_gender"])
+
+    def remove(self, user_id: int) -> Optional[_Waiter]:
+        if self._changed is not None:
+            self._changed.add(user_id)
+        waiter = self._waiting.pop(user_id, None)
+        if waiter is not None:
+            self._unindex(user_id, waiter)
+        self._dirty.pop(user_id, None)
+        return waiter
+
+    @staticmethod
+    def _discard(mapping: Dict[Any, "OrderedDict[int, None]"], key: Any, user_id: int):
+        members = mapping.get(key)
+        if members is not None:
+            members.pop(user_id, None)
+            if not members:
+                del mapping[key]
+
+    def _unindex(self, user_id: int, waiter: _Waiter):
+        self._discard(self._buckets, waiter.bucket, user_id)
+        self._discard(self._open, waiter.bucket, user_id)
+        for interest in waiter.interests:
+            self._discard(self._index, (interest, waiter.bucket), user_id)
+
+    def next_deadline_in(self) -> Optional[float]:
+        """Секунды до ближайшего перехода пользователя к поиску любого собеседника."""
+        while self._pending and self._pending[0][1] not in self._waiting:
+            self._pending.popleft()
+        if not self._pending:
+            return None
+        return max(0.0, self._pending[0][0] - time.monotonic())
+
+    async def wait(self):
+        await self._ready.wait()
+        self._ready.clear()
+
+    def _promote_expired(self):
+        now = time.monotonic()
+        while self._pending and self._pending[0][0] <= now:
+            _, user_id = self._pending.popleft()
+            waiter = self._waiting.get(user_id)
+            if waiter is None:
+                continue
+            members = self._open.setdefault(waiter.bucket, OrderedDict())
+            if user_id not in members:
+                members[user_id] = None
+                self._dirty[user_id] = None
+
+    @staticmethod
+    def _first_other(members: Iterable[int], user_id: int) -> Optional[int]:
+        for candidate in members:
+            if candidate != user_id:
+                return candidate
+        return None
+
+    def _find_partner(self, user_id: int, waiter: _Waiter) -> Optional[int]:
+        buckets = compatible_buckets(*waiter.bucket)
+        for interest in waiter.interests:
+            for bucket in buckets:
+                candidate = self._first_other(self._index.get((interest, bucket), ()), user_id)
+                if candidate is not None:
+                    return candidate
+
+        if user_id not in self._open.get(waiter.bucket, ()):
+            return None
+        # Из совместимых корзин берём того, кто ждёт дольше всех.
+        best = None
+        for bucket in buckets:
+            candidate = self._first_other(self._open.get(bucket, ()), user_id)
+            if candidate is not None and (
+                best is None or self._waiting[candidate].enqueued_at < self._waiting[best].enqueued_at
+            ):
+                best = candidate
+        return best
+
+    def _take(self, user_id: int, now: float):
+        waiter = self.remove(user_id)
+        wait = now - waiter.enqueued_at
+        self._taken[user_id] = (waiter, wait)
+        stats = self._stats.setdefault(waiter.bucket, _BucketStats())
+        stats.matched += 1
+        stats.wait_total += wait
+
+    def pop_pairs(self) -> List[Tuple[int, int]]:
+        """
+        Забирает из очереди все возможные пары. Проверяются только новые
+        пользователи и те, у кого истекло ожидание по интересам, поэтому
+        стоимость не зависит от общего числа ждущих.
+        """
+        self._promote_expired()
+        self._taken.clear()
+        now = time.monotonic()
+        pairs = []
+        while self._dirty:
+            user_id, _ = self._dirty.popitem(last=False)
+            waiter = self._waiting.get(user_id)
+            if waiter is None:
+                continue
+            partner = self._find_partner(user_id, waiter)
+            if partner is not None:
+                self._take(user_id, now)
+                self._take(partner, now)
+                pairs.append((partner, user_id))
+        return pairs
+
+    def waited(self, user_id: int) -> Optional[float]:
+        """Сколько ждал пользователь, забранный последним pop_pairs."""
+        taken = self._taken.get(user_id)
+        return taken[1] if taken is not None else None
+
+    def restore(self, user_ids: Iterable[int]):
+        """Возвращает в очередь пользователей из последнего pop_pairs, которых не удалось соединить."""
+        for user_id in user_ids:
+            taken = self._taken.pop(user_id, None)
+            if taken is not None:
+                waiter, wait = taken
+                stats = self._stats[waiter.bucket]
+                stats.matched -= 1
+                stats.wait_total -= wait
+                # Уже добавлен заново с новым профилем (например, из уведомления).
+                if user_id in self._waiting:
+                    continue
+                self.push(user_id, waiter.interests, *waiter.bucket, enqueued_at=waiter.enqueued_at)
+
+    def bucket_stats(self) -> Dict[BucketKey, Dict[str, float]]:
+        """Глубина очереди, ожидание старейшего и среднее ожидание до пары по корзинам."""
+        now = time.monotonic()
+        result = {}
+        for bucket in set(self._buckets) | set(self._stats):
+            members = self._buckets.get(bucket)
+            stats = self._stats.get(bucket) or _BucketStats()
+            oldest = self._waiting[next(iter(members))].enqueued_at if members else now
+            result[bucket] = {
+                "depth": len(members or ()),
+                "oldest_wait": now - oldest,
+                "matched": stats.matched,
+                "avg_match_wait": stats.wait_total / stats.matched if stats.matched else 0.0,
+            }
+        return result
+
+    def clear(self):
+        for user_id in list(self._waiting):
+            self.remove(user_id)
+        self._pending.clear()
+
+    def begin_reload(self):
+        """Начинает запоминать пользователей, добавленных или удалённых до reload()."""
+        self._changed = set()
+
+    def reload(self, profiles: Iterable[Tuple[int, Any]]):
+        """
+        Сливает очередь со списком ищущих, прочитанным из базы после
+        begin_reload(), в порядке ожидания. Пользователи, добавленные,
+        удалённые или забранные в пару за время чтения, не трогаются:
+        их текущее состояние новее прочитанного.
+        """
+        changed, self._changed = self._changed or set(), None
+        searching = set()
+        for user_id, profile in profiles:
+            searching.add(user_id)
+            if user_id not in changed and user_id not in self._taken and user_id not in self._waiting:
+                self.push_profile(user_id, profile)
+        for user_id in list(self._waiting):
+            if user_id not in searching and user_id not in changed:
+                self.remove(user_id)
+
+    def cancel_reload(self):
+        self._changed = None
+
+    def wake(self):
+        """Будит матчер, ждущий в wait(), даже если пар нет."""
+        self._ready.set()
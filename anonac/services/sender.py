@@ -0,0 +1,296 @@
+import asyncio
+import heapq
+import itertools
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage, TelegramMethod
+
+logger = logging.getLogger(__name__)
+
+# Полосы приоритета: системные уведомления обслуживаются раньше пересылки.
+LANE_SYSTEM = 0
+LANE_RELAY = 1
+LANES = (LANE_SYSTEM, LANE_RELAY)
+LANE_NAMES = {LANE_SYSTEM: "system", LANE_RELAY: "relay"}
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Секунды до появления токена (0 — токен есть)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> float:
+        """Забирает токен, если он есть; иначе возвращает время ожидания."""
+        delay = self.delay(now)
+        if delay == 0.0:
+            self.tokens -= 1
+        return delay
+
+
+class _Item:
+    __slots__ = ("method", "lane", "future", "retries")
+
+    def __init__(self, method: TelegramMethod, lane: int, future: asyncio.Future):
+        self.method = method
+        self.lane = lane
+        self.future = future
+        self.retries = 0
+
+
+class _Chat:
+    __slots__ = ("items", "bucket", "busy", "scheduled", "blocked_until")
+
+    def __init__(self, bucket: TokenBucket):
+        self.items: Deque[_Item] = deque()
+        self.bucket = bucket
+        self.busy = False
+        self.scheduled = False
+        self.blocked_until = 0.0
+
+
+class SendScheduler:
+    """
+    Единая очередь исходящих запросов к Bot API.
+
+    Соблюдает общий лимит бота (global_rate сообщений в секунду) и лимит
+    на чат (chat_rate с запасом chat_burst), сохраняет порядок сообщений
+    внутри чата и при TelegramRetryAfter откладывает чат на retry_after.
+    Системные уведомления и пересылка идут в разных полосах; каждая полоса
+    ограничена queue_size запросами, после чего отправители ждут.
+    """
+
+    def __init__(
+        self,
+        bot: Bot,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        queue_size: int = 1000,
+        max_in_flight: int = 30,
+        max_retries: int = 3,
+        max_chats: int = 100_000,
+    ):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.max_chats = max_chats
+        self._loop = asyncio.get_running_loop()
+        self._global = TokenBucket(global_rate, global_rate, self._loop.time())
+        self._chats: "OrderedDict[int, _Chat]" = OrderedDict()
+        self._ready: Dict[int, List[Tuple[float, int, int]]] = {lane: [] for lane in LANES}
+        self._capacity = {lane: asyncio.Semaphore(queue_size) for lane in LANES}
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight = set()
+
+        self.queued = {lane: 0 for lane in LANES}
+        self.sent = {lane: 0 for lane in LANES}
+        self.failed = {lane: 0 for lane in LANES}
+        self.blocked_submits = {lane: 0 for lane in LANES}
+        self.blocked_seconds = {lane: 0.0 for lane in LANES}
+        self.retry_after = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10.0):
+        """Ждёт отправки поставленных в очередь запросов не дольше timeout секунд."""
+        deadline = self._loop.time() + timeout
+        while (sum(self.queued.values()) or self._inflight) and self._loop.time() < deadline:
+            await asyncio.sleep(0.05)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for chat in self._chats.values():
+            for item in chat.items:
+                if not item.future.done():
+                    item.future.cancel()
+        left = sum(self.queued.values())
+        if left:
+            logger.warning("Не отправлено запросов при остановке: %s", left)
+
+    async def submit(self, method: TelegramMethod, lane: int = LANE_RELAY, chat_id: Optional[int] = None) -> asyncio.Future:
+        """
+        Ставит запрос в очередь и возвращает future с результатом вызова.
+        chat_id нужен для методов без поля chat_id (например, AnswerCallbackQuery).
+        """
+        capacity = self._capacity[lane]
+        if capacity.locked():
+            self.blocked_submits[lane] += 1
+            started = self._loop.time()
+            await capacity.acquire()
+            self.blocked_seconds[lane] += self._loop.time() - started
+        else:
+            await capacity.acquire()
+
+        future = self._loop.create_future()
+        future.add_done_callback(lambda _: capacity.release())
+        self.queued[lane] += 1
+
+        if chat_id is None:
+            chat_id = method.chat_id
+        chat = self._chat(chat_id)
+        chat.items.append(_Item(method, lane, future))
+        if not chat.busy and not chat.scheduled:
+            self._schedule(chat_id, chat)
+        return future
+
+    async def send(self, method: TelegramMethod, lane: int = LANE_RELAY, chat_id: Optional[int] = None) -> Any:
+        """Отправляет запрос через очередь и ждёт результата."""
+        return await (await self.submit(method, lane, chat_id))
+
+    async def post(self, method: TelegramMethod, lane: int = LANE_SYSTEM) -> asyncio.Future:
+        """Ставит запрос в очередь без ожидания отправки; ошибки только логируются."""
+        future = await self.submit(method, lane)
+        future.add_done_callback(self._log_failure)
+        return future
+
+    async def send_text(self, chat_id: int, text: str, lane: int = LANE_SYSTEM, **kwargs) -> asyncio.Future:
+        return await self.post(SendMessage(chat_id=chat_id, text=text, **kwargs), lane)
+
+    @staticmethod
+    def _log_failure(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Ошибка при отправке уведомления: %s", future.exception())
+
+    def _chat(self, chat_id: int) -> _Chat:
+        chat = self._chats.get(chat_id)
+        if chat is None:
+            chat = _Chat(TokenBucket(self.chat_rate, self.chat_burst, self._loop.time()))
+            self._chats[chat_id] = chat
+            self._evict_idle()
+        else:
+            self._chats.move_to_end(chat_id)
+        return chat
+
+    def _evict_idle(self):
+        while len(self._chats) > self.max_chats:
+            chat_id, chat = next(iter(self._chats.items()))
+            if chat.items or chat.busy:
+                break
+            del self._chats[chat_id]
+
+    def _schedule(self, chat_id: int, chat: _Chat):
+        now = self._loop.time()
+        ready_at = max(now + chat.bucket.delay(now), chat.blocked_until)
+        heapq.heappush(self._ready[chat.items[0].lane], (ready_at, next(self._seq), chat_id))
+        chat.scheduled = True
+        self._wakeup.set()
+
+    def _pop_ready(self, now: float) -> Tuple[Optional[int], Optional[float]]:
+        next_at = None
+        for lane in LANES:
+            heap = self._ready[lane]
+            if heap and heap[0][0] <= now:
+                return heapq.heappop(heap)[2], None
+            if heap:
+                next_at = heap[0][0] if next_at is None else min(next_at, heap[0][0])
+        return None, next_at
+
+    async def _run(self):
+        while True:
+            now = self._loop.time()
+            chat_id, next_at = self._pop_ready(now)
+            if chat_id is None:
+                self._wakeup.clear()
+                timeout = None if next_at is None else next_at - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            chat = self._chats.get(chat_id)
+            if chat is None:
+                continue
+            chat.scheduled = False
+            # Занятый чат перепланирует себя сам по завершении отправки.
+            if chat.busy or not chat.items:
+                continue
+            if chat.blocked_until > now or chat.bucket.take(now) > 0:
+                self._schedule(chat_id, chat)
+                continue
+
+            # Чат помечается занятым до ожидания общего лимита и слота:
+            # иначе submit() в это время снова поставит его в очередь, и
+            # первый запрос чата уйдёт дважды.
+            chat.busy = True
+            try:
+                delay = self._global.take(now)
+                while delay > 0:
+                    await asyncio.sleep(delay)
+                    delay = self._global.take(self._loop.time())
+                await self._slots.acquire()
+            except BaseException:
+                chat.busy = False
+                raise
+            task = asyncio.create_task(self._deliver(chat_id, chat))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id: int, chat: _Chat):
+        try:
+            if not chat.items:
+                return
+            item = chat.items[0]
+            result = await self.bot(item.method)
+        except TelegramRetryAfter as e:
+            self.retry_after += 1
+            item.retries += 1
+            chat.blocked_until = self._loop.time() + e.retry_after
+            logger.warning("Превышен лимит Telegram для чата %s, повтор через %s с.", chat_id, e.retry_after)
+            if item.retries > self.max_retries:
+                self._finish(chat, exception=e)
+        except Exception as e:
+            self._finish(chat, exception=e)
+        else:
+            self._finish(chat, result=result)
+        finally:
+            chat.busy = False
+            self._slots.release()
+            if chat.items:
+                self._schedule(chat_id, chat)
+
+    def _finish(self, chat: _Chat, result: Any = None, exception: Optional[BaseException] = None):
+        item = chat.items.popleft()
+        self.queued[item.lane] -= 1
+        if exception is not None:
+            self.failed[item.lane] += 1
+            if not item.future.done():
+                item.future.set_exception(exception)
+        else:
+            self.sent[item.lane] += 1
+            if not item.future.done():
+                item.future.set_result(result)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            LANE_NAMES[lane]: {
+                "queued": self.queued[lane],
+                "sent": self.sent[lane],
+                "failed": self.failed[lane],
+                "blocked_submits": self.blocked_submits[lane],
+                "blocked_seconds": self.blocked_seconds[lane],
+            }
+            for lane in LANES
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set
+from anonac.database.controller import Database, UserController
+from anonac.services.search_queue import SearchQueue
+from anonac.services.warmup import load_runtime_state
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "anonac_userdata"
+
+
+class StateSync:
+    """
+    Применяет изменения пользователей, сделанные другими экземплярами бота,
+    к локальному кэшу и очереди поиска. События приходят из триггера
+    userdata_notify_change; после переподключения состояние полностью
+    перечитывается из базы, так как пропущенные уведомления не доставляются.
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        user_controller: UserController,
+        search_queue: SearchQueue,
+        known_users: Set[int],
+    ):
+        self.db = db
+        self.user_controller = user_controller
+        self.search_queue = search_queue
+        self.known_users = known_users
+        self._tasks = set()
+        self._connected = asyncio.Event()
+        self._ready = asyncio.Event()
+        # Перечитывания не должны пересекаться: begin_reload() второго
+        # сбросил бы изменения, отслеживаемые первым.
+        self._resync_lock = asyncio.Lock()
+
+        self.received = 0
+        self.applied = 0
+        self.resyncs = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    async def start(self, timeout: float = 10.0):
+        """
+        Подписывается на канал и ждёт первой полной синхронизации. Подписка
+        идёт до чтения состояния, чтобы не потерять изменения между ними.
+        Если за timeout подписаться не удалось, состояние читается без неё.
+        """
+        self.db.listen(CHANNEL, self._on_notify, self._on_connect)
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Не удалось подписаться на уведомления, состояние читается без подписки.")
+            await self.resync()
+            return
+        await self._ready.wait()
+
+    async def _on_connect(self, reconnected: bool):
+        self._connected.set()
+        await self.resync()
+        self._ready.set()
+
+    async def resync(self):
+        async with self._resync_lock:
+            await load_runtime_state(self.user_controller, self.search_queue, self.known_users)
+            self.resyncs += 1
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str):
+        self.received += 1
+        try:
+            user_id, status, signal_id, origin, sent_at = payload.split("|")
+        except ValueError:
+            logger.warning("Некорректное уведомление в канале %s: %s", channel, payload)
+            return
+
+        self.last_lag = max(0.0, time.time() - float(sent_at))
+        self.max_lag = max(self.max_lag, self.last_lag)
+        if origin == self.db.instance_id:
+            return
+        self.apply(int(user_id), status or None, int(signal_id) if signal_id else None)
+
+    def apply(self, user_id: int, status: Optional[str], signal_id: Optional[int]):
+        self.applied += 1
+        cache = self.user_controller.cache
+        if cache is not None:
+            cache.put(user_id, status, signal_id)
+
+        if status != "search":
+            self.search_queue.remove(user_id)
+        else:
+            # Профиль перечитывается и для тех, кто уже в очереди: уведомление
+            # могло прийти из-за смены пола или интересов во время поиска.
+            task = asyncio.create_task(self._enqueue(user_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _enqueue(self, user_id: int):
+        profile = await self.user_controller.get_search_profile(user_id)
+        if profile is None:
+            return
+        # Пока загружался профиль, пользователь мог уже выйти из поиска.
+        if await self.user_controller.get_status(user_id) == "search":
+            self.search_queue.push_profile(user_id, profile)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "received": self.received,
+            "applied": self.applied,
+            "resyncs": self.resyncs,
+            "last_lag": self.last_lag,
+            "max_lag": self.max_lag,
+        }
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+from typing import Optional
+from anonac.database.controller import UserController
+from anonac.messages import IDLE_STOP, SEARCH_EXPIRED
+from anonac.services.events import EVENT_END, EventRecorder
+from anonac.services.search_queue import SearchQueue
+from anonac.services.sender import SendScheduler
+
+logger = logging.getLogger(__name__)
+
+
+async def sweeper(
+    sender: SendScheduler,
+    user_controller: UserController,
+    search_queue: SearchQueue,
+    recorder: EventRecorder,
+    interval: float = 60,
+    idle_timeout: float = 1800,
+    search_timeout: float = 600,
+    batch: int = 500,
+    stop: Optional[asyncio.Event] = None,
+):
+    """
+    Раз в interval секунд записывает накопленную активность пользователей,
+    завершает диалоги без сообщений дольше idle_timeout и снимает с поиска
+    ждущих дольше search_timeout (0 — не снимать). Работает пачками по
+    batch строк, уступая цикл событий между пачками. Выходит после stop.
+    """
+    stop = stop or asyncio.Event()
+    while True:
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            await user_controller.flush_activity()
+
+            if idle_timeout > 0:
+                while True:
+                    ended = await user_controller.end_idle_chats(idle_timeout, batch)
+                    for id_1, id_2 in ended:
+                        recorder.record(EVENT_END, id_1, id_2, "idle")
+                        await sender.send_text(id_1, IDLE_STOP)
+                        await sender.send_text(id_2, IDLE_STOP)
+                    if len(ended) < batch:
+                        break
+                    await asyncio.sleep(0)
+
+            if search_timeout > 0:
+                while True:
+                    expired = await user_controller.expire_searches(search_timeout, batch)
+                    for user_id in expired:
+                        search_queue.remove(user_id)
+                        await sender.send_text(user_id, SEARCH_EXPIRED)
+                    if len(expired) < batch:
+                        break
+                    await asyncio.sleep(0)
+        except Exception as e:
+            logger.error("[Sweeper Error] Ошибка при очистке диалогов и поиска: %s", e)
@@ -0,0 +1,79 @@
+import logging
+import time
+from typing import Dict, Set
+from anonac.database.controller import UserController
+from anonac.services.search_queue import SearchQueue
+
+logger = logging.getLogger(__name__)
+
+
+async def load_runtime_state(
+    user_controller: UserController,
+    search_queue: SearchQueue,
+    known_users: Set[int],
+) -> Dict[str, int]:
+    """
+    Восстанавливает состояние экземпляра одним потоковым чтением
+    пользователей в диалоге и в поиске: заполняет кэш статуса, очередь поиска
+    в порядке ожидания и добавляет их в известные. Остальные ID дочитывает
+    load_known_users уже после начала приёма обновлений.
+
+    При переподключении кэш и очередь не сбрасываются, а сливаются с
+    прочитанным: изменения, записанные или полученные из уведомлений за
+    время чтения, новее снимка и сохраняются.
+    """
+    started = time.monotonic()
+    cache = user_controller.cache
+    since = cache.begin_reload() if cache is not None else None
+    search_queue.begin_reload()
+
+    active = 0
+    searching = []
+    try:
+        async for row in user_controller.stream_runtime_state():
+            known_users.add(row["id"])
+            if row["status"] == "active":
+                active += 1
+                if cache is not None:
+                    cache.put(row["id"], "active", row["signal_id"], since=since)
+            elif row["status"] == "search":
+                searching.append(row)
+    except BaseException:
+        search_queue.cancel_reload()
+        raise
+    finally:
+        # Записи, не подтверждённые чтением и не изменённые за его время,
+        # могли устареть, пока уведомления не доставлялись.
+        if cache is not None:
+            cache.end_reload(since)
+
+    # Сортировка только ждущих в памяти дешевле ORDER BY по всей таблице.
+    searching.sort(key=lambda row: row["update_at"])
+    for row in searching:
+        if cache is not None:
+            cache.put(row["id"], "search", None, since=since)
+    search_queue.reload((row["id"], row) for row in searching)
+
+    logger.info(
+        "Состояние загружено за %.2f с: в диалоге %s, в поиске %s.",
+        time.monotonic() - started, active, len(searching)
+    )
+    return {"active": active, "search": len(searching)}
+
+
+async def load_known_users(user_controller: UserController, known_users: Set[int]) -> int:
+    """
+    Заполняет множество известных пользователей в фоне. Пока чтение не
+    закончено, незнакомый ID стоит только одного лишнего upsert при регистрации.
+    """
+    started = time.monotonic()
+    users = 0
+    try:
+        async for user_id in user_controller.stream_user_ids():
+            known_users.add(user_id)
+            users += 1
+    except Exception as e:
+        logger.error("Ошибка при загрузке известных пользователей: %s", e)
+        return users
+    logger.info("Известные пользователи загружены за %.2f с: %s.", time.monotonic() - started, users)
+    return users
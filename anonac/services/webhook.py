@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Обрабатывает обновления в фоне, но не более max_in_flight одновременно.
+    Когда все слоты заняты, ответ Telegram задерживается до освобождения
+    слота, и Telegram сам снижает темп доставки обновлений.
+    """
+
+    def __init__(
+        self,
+        dispatcher: Dispatcher,
+        bot: Bot,
+        max_in_flight: int = 100,
+        secret_token: Optional[str] = None,
+        **data: Any,
+    ):
+        super().__init__(dispatcher, bot, handle_in_background=True, secret_token=secret_token, **data)
+        self.max_in_flight = max_in_flight
+        self._slots = asyncio.Semaphore(max_in_flight)
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+
+    async def _feed_update(self, bot: Bot, update: Dict[str, Any]):
+        try:
+            await self._background_feed_update(bot=bot, update=update)
+        except Exception as e:
+            logger.error("Ошибка при обработке обновления из вебхука: %s", e)
+        finally:
+            self._slots.release()
+
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._feed_update(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+
+    async def close(self):
+        """Дожидается обработки принятых обновлений; сессию бота закрывает main."""
+        if self._background_feed_update_tasks:
+            await asyncio.gather(*self._background_feed_update_tasks, return_exceptions=True)
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    health_path: str = "/healthz",
+    secret_token: Optional[str] = None,
+    public_url: Optional[str] = None,
+    max_in_flight: int = 100,
+    stop: Optional[asyncio.Event] = None,
+    **data: Any,
+):
+    """
+    Запускает aiohttp-сервер вебхука. setWebhook вызывается только если задан
+    public_url, поэтому сервер можно поднять локально без доступа к сети.
+    После stop сервер перестаёт принимать запросы и дожидается обработки
+    уже принятых обновлений.
+    """
+    app = web.Application()
+    handler = BoundedRequestHandler(dp, bot, max_in_flight=max_in_flight, secret_token=secret_token, **data)
+    handler.register(app, path=path)
+
+    async def health(request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "ok",
+            "in_flight": handler.in_flight,
+            "max_in_flight": handler.max_in_flight,
+        })
+
+    app.router.add_get(health_path, health)
+    setup_application(app, dp, bot=bot, **data)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info("Вебхук слушает http://%s:%s%s", host, port, path)
+
+    try:
+        if public_url:
+            await bot.set_webhook(
+                url=public_url.rstrip("/") + path,
+                secret_token=secret_token,
+                allowed_updates=dp.resolve_used_update_types(),
+            )
+            logger.info("Вебхук зарегистрирован в Telegram: %s", public_url.rstrip('/') + path)
+        await (stop or asyncio.Event()).wait()
+    finally:
+        await runner.cleanup()
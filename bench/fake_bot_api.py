@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, Optional
+from aiohttp import web
+
+# Методы, которые в Bot API возвращают отправленное сообщение.
+MESSAGE_METHODS = {
+    "sendMessage", "sendPhoto", "sendVideo", "sendVoice", "sendVideoNote",
+    "sendDocument", "sendSticker", "sendAnimation", "sendAudio", "editMessageText",
+}
+
+
+class FakeBotAPI:
+    """
+    Локальный сервер, отвечающий на запросы бота как Bot API, без лимитов и сети.
+    on_send(method, params) вызывается для каждого запроса — через него
+    нагрузочный тест узнаёт, что и кому бот отправил.
+    """
+
+    def __init__(self, on_send: Optional[Callable[[str, Dict[str, Any]], None]] = None, latency: float = 0.0):
+        self.on_send = on_send
+        self.latency = latency
+        self.calls = Counter()
+        self._message_ids = itertools.count(1)
+        self._runner: Optional[web.AppRunner] = None
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.on_send is not None:
+            self.on_send(method, params)
+
+        if method in MESSAGE_METHODS:
+            result: Any = self._message(params)
+        elif method == "sendMediaGroup":
+            result = [self._message(params) for _ in json.loads(params.get("media", "[]"))]
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8081) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+        return f"http://{host}:{port}"
+
+    async def close(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+async def serve(host: str, port: int, latency: float):
+    api = FakeBotAPI(latency=latency)
+    url = await api.start(host, port)
+    print(f"Fake Bot API: {url} (TELEGRAM_API_URL={url})")
+    try:
+        while True:
+            await asyncio.sleep(10)
+            print(dict(api.calls))
+    finally:
+        await api.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Локальный фейковый Bot API для нагрузочных тестов.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="искусственная задержка ответа, с")
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.latency))
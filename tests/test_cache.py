@@ -0,0 +1,43 @@
+from anonac.database.cache import UNKNOWN, UserStateCache
+
+
+def test_read_result_does_not_overwrite_newer_write():
+    cache = UserStateCache()
+    since = cache.stamp()
+    cache.put(1, "unactive", None)
+    assert not cache.put(1, "active", 2, since=since)
+    assert cache.get_status(1) == "unactive"
+    assert cache.get_signal_id(1) is None
+
+
+def test_read_result_is_stored_when_nothing_changed():
+    cache = UserStateCache()
+    cache.put(2, "search", None)
+    since = cache.stamp()
+    assert cache.put(1, "active", 2, since=since)
+    assert cache.get_signal_id(1) == 2
+
+
+def test_invalidate_and_clear_reject_older_reads():
+    cache = UserStateCache()
+    cache.put(1, "active", 2)
+    since = cache.stamp()
+    cache.invalidate([1])
+    assert cache.get_status(1) is UNKNOWN
+    assert not cache.put(1, "active", 2, since=since)
+
+    since = cache.stamp()
+    cache.clear()
+    assert not cache.put(3, "active", 4, since=since)
+    assert cache.put(3, "active", 4, since=cache.stamp())
+
+
+def test_partial_put_keeps_other_fields_and_lru_bound():
+    cache = UserStateCache(max_size=2)
+    cache.put(1, "active", 2)
+    cache.put(1, status="unactive")
+    assert cache.get_signal_id(1) == 2
+    cache.put(2, "search")
+    cache.put(3, "search")
+    assert len(cache) == 2
+    assert cache.get_status(1) is UNKNOWN
@@ -0,0 +1,29 @@
+import asyncio
+from types import SimpleNamespace
+from anonac.handlers.chat import MediaGroupBuffer
+
+
+def message(message_id, group="g"):
+    return SimpleNamespace(message_id=message_id, media_group_id=group, chat=SimpleNamespace(id=1))
+
+
+def test_drain_flushes_pending_albums_and_waits_for_them():
+    flushed = []
+
+    async def flush(messages):
+        await asyncio.sleep(0.01)
+        flushed.append([m.message_id for m in messages])
+
+    async def scenario():
+        albums = MediaGroupBuffer(flush, window=10)
+        albums.add(message(2))
+        albums.add(message(1))
+        albums.add(message(3, "h"))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        assert await albums.drain(timeout=1)
+        return loop.time() - started
+
+    elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert sorted(flushed) == [[1, 2], [3]]
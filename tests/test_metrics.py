@@ -0,0 +1,12 @@
+from anonac.metrics import Registry
+
+
+def test_collected_counter_is_exported_as_counter():
+    registry = Registry()
+    registry.counter("anonac_test_total", "Тест.", lambda: {("a",): 2}, ("label",))
+    registry.gauge("anonac_test_size", "Тест.", lambda: 5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE anonac_test_total counter" in lines
+    assert 'anonac_test_total{label="a"} 2' in lines
+    assert "# TYPE anonac_test_size gauge" in lines
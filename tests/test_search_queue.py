@@ -0,0 +1,122 @@
+import pytest
+from anonac.services import search_queue as search_queue_module
+from anonac.services.search_queue import SearchQueue
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(search_queue_module, "time", clock)
+    return clock
+
+
+def test_shared_interest_beats_oldest_waiter(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1)
+    clock.now += 1
+    queue.push(2, ["music"])
+    clock.now += 1
+    queue.push(3, ["music"])
+
+    assert queue.pop_pairs() == [(3, 2)]
+    assert 1 in queue
+
+
+def test_interest_users_fall_back_after_interest_wait(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, ["music"])
+    queue.push(2, ["sport"])
+
+    assert queue.pop_pairs() == []
+    assert queue.next_deadline_in() == 10
+
+    clock.now += 10
+    pairs = queue.pop_pairs()
+    assert [sorted(pair) for pair in pairs] == [[1, 2]]
+    assert len(queue) == 0
+
+
+def test_restore_keeps_original_enqueue_time(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1)
+    queue.push(2)
+    clock.now += 4
+    assert len(queue.pop_pairs()) == 1
+
+    clock.now += 1
+    queue.restore([1, 2])
+    assert len(queue) == 2
+    assert queue.bucket_stats()[(None, None)]["oldest_wait"] == 5
+    assert len(queue.pop_pairs()) == 1
+
+
+def test_repush_replaces_interest_index(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, ["music"])
+    queue.push(1, ["sport"])
+    queue.push(2, ["music"])
+
+    assert queue.pop_pairs() == []
+    assert 1 not in queue._index.get(("music", (None, None)), ())
+
+    queue.push(3, ["sport"])
+    assert queue.pop_pairs() == [(1, 3)]
+
+
+def test_gender_filter_is_not_matched_by_any_filter(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, gender="male", wanted="female")
+    queue.push(2, gender="male")
+
+    assert queue.pop_pairs() == []
+
+
+def test_unknown_gender_never_matches_specific_wish(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, gender="female", wanted="male")
+    queue.push(2)
+
+    assert queue.pop_pairs() == []
+
+    queue.push(3, gender="male")
+    assert queue.pop_pairs() == [(1, 3)]
+
+
+def test_bucket_stats_after_restore(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, gender="male")
+    clock.now += 2
+    queue.push(2, gender="male")
+    clock.now += 2
+    queue.pop_pairs()
+    stats = queue.bucket_stats()[("male", None)]
+    assert (stats["depth"], stats["matched"], stats["avg_match_wait"]) == (0, 2, 3)
+
+    clock.now += 1
+    queue.restore([1, 2])
+    stats = queue.bucket_stats()[("male", None)]
+    assert (stats["depth"], stats["matched"], stats["oldest_wait"]) == (2, 0, 5)
+
+    clock.now += 1
+    queue.pop_pairs()
+    stats = queue.bucket_stats()[("male", None)]
+    assert (stats["depth"], stats["matched"], stats["avg_match_wait"]) == (0, 2, 5)
+
+
+def test_restore_keeps_newer_profile(clock):
+    queue = SearchQueue(interest_wait=10)
+    queue.push(1, gender="male")
+    queue.push(2, gender="male")
+    assert len(queue.pop_pairs()) == 1
+
+    queue.push(1, gender="male", wanted="female")
+    queue.restore([1, 2])
+    assert queue.pop_pairs() == []
@@ -0,0 +1,130 @@
+import asyncio
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+from anonac.services.sender import LANE_RELAY, LANE_SYSTEM, SendScheduler
+
+
+class FakeBot:
+    """Записывает вызовы и отвечает текстом сообщения после задержки latency."""
+
+    def __init__(self, latency: float = 0.0, retry_after: int = 0):
+        self.latency = latency
+        self.retry_after = retry_after
+        self.calls = []
+        self.active = {}
+
+    async def __call__(self, method):
+        chat_id = method.chat_id
+        self.active[chat_id] = self.active.get(chat_id, 0) + 1
+        assert self.active[chat_id] == 1, f"параллельная отправка в чат {chat_id}"
+        try:
+            self.calls.append((chat_id, method.text))
+            await asyncio.sleep(self.latency)
+            if self.retry_after:
+                self.retry_after -= 1
+                raise TelegramRetryAfter(method, "Too Many Requests", 0)
+            return method.text
+        finally:
+            self.active[chat_id] -= 1
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_chat_is_not_delivered_twice_while_waiting_for_global_limit():
+    async def scenario():
+        bot = FakeBot(latency=0.8)
+        sender = SendScheduler(bot, global_rate=2, chat_rate=100, chat_burst=100)
+        sender.start()
+        # Две отправки в другие чаты забирают все токены общего лимита,
+        # поэтому планировщик ждёт, уже выбрав чат 3.
+        await sender.submit(SendMessage(chat_id=1, text="a"))
+        await sender.submit(SendMessage(chat_id=2, text="b"))
+        first = await sender.submit(SendMessage(chat_id=3, text="c1"))
+        await asyncio.sleep(0.05)
+        second = await sender.submit(SendMessage(chat_id=3, text="c2"))
+        results = await asyncio.gather(first, second)
+        await sender.close(timeout=1)
+        return bot.calls, results
+
+    calls, results = run(scenario())
+    assert [text for chat_id, text in calls if chat_id == 3] == ["c1", "c2"]
+    assert results == ["c1", "c2"]
+
+
+def test_messages_in_chat_keep_order_and_results():
+    async def scenario():
+        bot = FakeBot(latency=0.001)
+        sender = SendScheduler(bot, global_rate=1000, chat_rate=1000, chat_burst=1000)
+        sender.start()
+        futures = [await sender.submit(SendMessage(chat_id=7, text=str(i))) for i in range(20)]
+        results = await asyncio.gather(*futures)
+        await sender.close(timeout=1)
+        return bot.calls, results, sender.stats()
+
+    calls, results, stats = run(scenario())
+    assert [text for _, text in calls] == [str(i) for i in range(20)]
+    assert results == [str(i) for i in range(20)]
+    assert stats["relay"]["sent"] == 20
+    assert stats["relay"]["queued"] == 0
+
+
+def test_slots_are_released_under_contention():
+    async def scenario():
+        bot = FakeBot(latency=0.001)
+        sender = SendScheduler(bot, global_rate=50, chat_rate=1000, chat_burst=1000, max_in_flight=2)
+        sender.start()
+        futures = []
+        for i in range(60):
+            futures.append(await sender.submit(SendMessage(chat_id=i % 3, text=str(i))))
+            await asyncio.sleep(0)
+        await asyncio.wait_for(asyncio.gather(*futures), 5)
+        await sender.close(timeout=1)
+        return sender
+
+    sender = run(scenario())
+    assert sender.sent[LANE_RELAY] == 60
+    assert sender._slots._value == 2
+
+
+def test_retry_after_is_retried():
+    async def scenario():
+        bot = FakeBot(retry_after=1)
+        sender = SendScheduler(bot, global_rate=1000, chat_rate=1000, chat_burst=1000)
+        sender.start()
+        result = await sender.send(SendMessage(chat_id=1, text="x"), LANE_SYSTEM)
+        await sender.close(timeout=1)
+        return result, bot.calls, sender.retry_after
+
+    result, calls, retry_after = run(scenario())
+    assert result == "x"
+    assert calls == [(1, "x"), (1, "x")]
+    assert retry_after == 1
+
+
+def test_close_drains_queue():
+    async def scenario():
+        bot = FakeBot(latency=0.001)
+        sender = SendScheduler(bot, global_rate=1000, chat_rate=1000, chat_burst=1000)
+        sender.start()
+        for i in range(5):
+            await sender.send_text(i, "bye")
+        await sender.close(timeout=1)
+        return bot.calls
+
+    assert len(run(scenario())) == 5
+
+
+def test_method_without_chat_id_is_queued_for_given_chat():
+    async def scenario():
+        bot = FakeBot()
+        sender = SendScheduler(bot, global_rate=1000, chat_rate=1000, chat_burst=1000)
+        sender.start()
+        result = await sender.send(SendMessage(chat_id=1, text="a"), LANE_SYSTEM, chat_id=7)
+        await sender.close(timeout=1)
+        return result, sender._chats
+
+    result, chats = run(scenario())
+    assert result == "a"
+    assert 7 in chats and 1 not in chats
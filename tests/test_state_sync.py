@@ -0,0 +1,63 @@
+import asyncio
+from anonac.database.cache import UserStateCache
+from anonac.services.search_queue import SearchQueue
+from anonac.services.state_sync import StateSync
+
+
+class FakeController:
+    def __init__(self, profiles):
+        self.cache = UserStateCache()
+        self.profiles = profiles
+
+    async def get_search_profile(self, user_id):
+        return self.profiles.get(user_id)
+
+    async def get_status(self, user_id):
+        return "search" if user_id in self.profiles else "unactive"
+
+
+def test_profile_change_moves_queued_user_to_new_bucket():
+    queue = SearchQueue()
+    queue.push(1, gender="male")
+    queue.push(2, gender="male")
+    controller = FakeController({1: {"interests": None, "gender": "male", "search_gender": "female"}})
+    sync = StateSync(None, controller, queue, set())
+
+    async def scenario():
+        sync.apply(1, "search", None)
+        await asyncio.gather(*sync._tasks)
+
+    asyncio.run(scenario())
+    assert queue.pop_pairs() == []
+
+
+class SlowSnapshot(FakeController):
+    """Каждое чтение отдаёт снимок, в котором пользователя 5 ещё нет в поиске."""
+
+    def __init__(self, queue):
+        super().__init__({})
+        self.queue = queue
+        self.reads = 0
+
+    async def stream_runtime_state(self):
+        self.reads += 1
+        if self.reads == 2:
+            # /search во время второго чтения.
+            self.queue.push(5)
+        for _ in range(3):
+            await asyncio.sleep(0.01)
+        return
+        yield
+
+
+def test_resyncs_do_not_overlap():
+    queue = SearchQueue()
+    controller = SlowSnapshot(queue)
+    sync = StateSync(None, controller, queue, set())
+
+    async def scenario():
+        await asyncio.gather(sync.resync(), sync.resync())
+
+    asyncio.run(scenario())
+    assert sync.resyncs == 2
+    assert 5 in queue
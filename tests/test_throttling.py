@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+from aiogram.types import Chat, Message, PhotoSize, User
+from anonac.middlewares.throttling import ThrottlingMiddleware
+
+USER = User(id=1, is_bot=False, first_name="user")
+
+
+def photo(message_id, media_group_id=None):
+    return Message(
+        message_id=message_id,
+        date=datetime.now(),
+        chat=Chat(id=1, type="private"),
+        from_user=USER,
+        photo=[PhotoSize(file_id="f", file_unique_id="u", width=1, height=1)],
+        media_group_id=media_group_id,
+    )
+
+
+def run(middleware, events):
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.message_id)
+
+    async def main():
+        for event in events:
+            await middleware(handler, event, {"event_from_user": USER})
+
+    asyncio.run(main())
+    return handled
+
+
+def test_album_takes_one_token():
+    middleware = ThrottlingMiddleware({"photo": (0.001, 2)})
+    album = [photo(i, "a") for i in range(1, 6)]
+    assert run(middleware, album) == [1, 2, 3, 4, 5]
+    assert run(middleware, [photo(6)]) == [6]
+    assert run(middleware, [photo(7)]) == []
+
+
+def test_rejected_album_is_rejected_whole():
+    middleware = ThrottlingMiddleware({"photo": (0.001, 1)})
+    assert run(middleware, [photo(1)]) == [1]
+    assert run(middleware, [photo(i, "b") for i in range(2, 6)]) == []
+    assert middleware.throttled == 4
@@ -0,0 +1,78 @@
+import asyncio
+from anonac.database.cache import UNKNOWN, UserStateCache
+from anonac.services.search_queue import SearchQueue
+from anonac.services.warmup import load_known_users, load_runtime_state
+
+PROFILE = {"interests": [], "gender": None, "search_gender": None}
+
+
+def row(user_id, status, signal_id=None, update_at=0):
+    return {"id": user_id, "status": status, "signal_id": signal_id, "update_at": update_at, **PROFILE}
+
+
+class FakeController:
+    """Отдаёт снимок userdata; during(i) вызывается перед i-й строкой, как изменение во время чтения."""
+
+    def __init__(self, rows, during=None):
+        self.cache = UserStateCache()
+        self.rows = rows
+        self.during = during or (lambda index: None)
+
+    async def stream_runtime_state(self):
+        for index, item in enumerate(self.rows):
+            self.during(index)
+            await asyncio.sleep(0)
+            yield item
+
+    async def stream_user_ids(self):
+        for item in self.rows:
+            yield item["id"]
+
+
+def test_changes_during_reload_win_over_snapshot():
+    queue = SearchQueue()
+    controller = FakeController([row(1, "active", 2), row(2, "active", 1)])
+    controller.cache.put(3, "active", 4)
+
+    def during(index):
+        if index == 0:
+            # Уведомление: диалог 1-2 завершён другим экземпляром.
+            controller.cache.put(1, "unactive", None)
+            # Локальный /search после снимка.
+            controller.cache.put(5, "search", None)
+            queue.push_profile(5, PROFILE)
+
+    controller.during = during
+    asyncio.run(load_runtime_state(controller, queue, set()))
+
+    assert controller.cache.get_status(1) == "unactive"
+    assert controller.cache.get_signal_id(1) is None
+    assert controller.cache.get_signal_id(2) == 1
+    assert controller.cache.get_status(3) is UNKNOWN
+    assert controller.cache.get_status(5) == "search"
+    assert 5 in queue
+
+
+def test_queue_is_merged_with_snapshot():
+    queue = SearchQueue()
+    queue.push_profile(6, PROFILE)
+    queue.push_profile(8, PROFILE)
+    controller = FakeController([row(7, "search", update_at=1), row(8, "search")])
+    controller.during = lambda index: queue.remove(8) if index == 0 else None
+
+    known = set()
+    stats = asyncio.run(load_runtime_state(controller, queue, known))
+
+    assert 6 not in queue
+    assert 7 in queue
+    assert 8 not in queue
+    assert known == {7, 8}
+    assert stats == {"active": 0, "search": 2}
+
+
+def test_known_users_are_loaded_separately():
+    controller = FakeController([row(1, "unactive"), row(2, "active", 3), row(3, "active", 2)])
+    known = {9}
+
+    assert asyncio.run(load_known_users(controller, known)) == 3
+    assert known == {1, 2, 3, 9}